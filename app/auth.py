@@ -1,22 +1,34 @@
+import hashlib
+import time
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
-from app import models, schemas
+from app import models, revocation, schemas
+from app.cache import LRUCache
 from app.config import settings
 from app.database import get_db 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# passlib/bcrypt and jose are imported on first use: anonymous GETs never
+# need them, and they add noticeably to Lambda cold starts.
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def create_access_token(data: dict):
+    from jose import jwt
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
@@ -24,26 +36,79 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def user_claims(user: models.User) -> dict:
+    """The claims a user's access token carries: who they are, their role and their token version."""
+    return {"sub": user.email, "uid": user.id, "admin": bool(user.is_admin), "ver": user.token_version or 0}
+
+
+class Principal(NamedTuple):
+    """The authenticated user, as the token describes them. Stands in for `models.User` in route dependencies."""
+    id: int
+    email: str
+    is_admin: bool
+    token_version: int
+    expires: float
+    # The revocation epoch the token was verified in (see app/revocation.py)
+    epoch: int
+
+
+# Verified principals by SHA-256 of the token. Within PRINCIPAL_CACHE_TTL a
+# token is trusted without decoding it or reading its user row again, unless
+# a revocation has happened since.
+principal_cache = LRUCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES, settings.PRINCIPAL_CACHE_TTL)
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+async def _verify(token: str, db: AsyncSession, epoch: int) -> Optional[Principal]:
+    """
+    Decode `token` and check it against its user row: the token is valid
+    while the user exists and their token version and role still match the
+    claims. Tokens issued before claims were added only carry `sub`; they
+    count as version 0 and take their role from the row.
+    """
+    from jose import JWTError, jwt
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    if email is None or "exp" not in payload:
+        return None
+    token_data = schemas.TokenData(email=email)
+    row = (await db.execute(
+        select(models.User.id, models.User.is_admin, models.User.token_version)
+        .where(models.User.email == token_data.email)
+    )).one_or_none()
+    if row is None or (row.token_version or 0) != payload.get("ver", 0):
+        return None
+    is_admin = bool(row.is_admin)
+    if payload.get("admin", is_admin) != is_admin:
+        return None
+    return Principal(row.id, token_data.email, is_admin, payload.get("ver", 0), payload["exp"], epoch)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    key = token_key(token)
+    principal = principal_cache.get(key)
+    epoch = await revocation.current(db)
+    if principal is None or principal.epoch != epoch:
+        principal = await _verify(token, db, epoch)
+        if principal is None:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
-    if user is None:
+        principal_cache.put(key, principal)
+    if principal.expires <= time.time():
         raise credentials_exception
-    return user
+    return principal
 
-def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+def get_current_admin_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -51,3 +116,25 @@ def get_current_admin_user(current_user: models.User = Depends(get_current_user)
         )
     return current_user
 
+
+async def revoke_tokens(db: AsyncSession, user_id: int) -> bool:
+    """
+    Invalidate every token issued to a user so far by bumping their token
+    version. Returns False if there is no such user.
+
+    The revocation epoch is bumped in the same transaction. This container
+    forgets its verified tokens at once; other containers see the new epoch
+    within REVOCATION_CHECK_TTL seconds and re-verify their cached tokens.
+    """
+    result = await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(token_version=func.coalesce(models.User.token_version, 0) + 1)
+    )
+    if result.rowcount == 0:
+        return False
+    await revocation.bump(db)
+    await db.commit()
+    principal_cache.clear()
+    revocation.forget()
+    return True
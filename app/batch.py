@@ -0,0 +1,45 @@
+from typing import Dict, List
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app import includes, models
+from app.config import settings
+
+
+def parse_ids(ids: str) -> List[int]:
+    """Parse a comma-separated `ids=` value, dropping repeats but keeping request order."""
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed:
+        raise HTTPException(status_code=400, detail="At least one id is required")
+    if len(parsed) > settings.BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_IDS} ids per batch")
+    return parsed
+
+
+def in_request_order(ids: List[int], found: Dict[int, object]) -> dict:
+    """A batch response body: found rows in the order asked for, plus the ids that don't exist."""
+    return {
+        "items": [found[i] for i in ids if i in found],
+        "missing": [i for i in ids if i not in found],
+    }
+
+
+async def firearms(db, ids: List[int], plan: includes.Plan) -> dict:
+    """
+    Load firearms by id as planned by `includes.plan`.
+
+    That is one `IN` query for the firearms plus one per included
+    relationship, however many ids are asked for.
+    """
+    result = await db.execute(
+        select(models.Firearm)
+        .where(models.Firearm.firearm_id.in_(ids))
+        .options(*plan.options())
+    )
+    found = {firearm.firearm_id: plan.expand(firearm) for firearm in result.scalars()}
+    return in_request_order(ids, found)
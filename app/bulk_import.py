@@ -0,0 +1,226 @@
+import csv
+import json
+from collections import deque
+from typing import AsyncIterator, Dict, List, NamedTuple, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import documents, models, schemas, versioning
+from app.config import settings
+
+# Relationship field of schemas.FirearmImport -> (lookup model, junction table, junction key)
+RELATIONS = {
+    "types": (models.Type, models.firearm_types, "type_id"),
+    "wars": (models.War, models.firearm_wars, "war_id"),
+    "cartridges": (models.Cartridge, models.firearm_cartridges, "cartridge_id"),
+    "manufacturers": (models.Manufacturer, models.firearm_manufacturers, "manufacturer_id"),
+    "variants": (models.Variant, models.firearm_variants, "variant_id"),
+}
+COLUMNS = ("designer", "designed", "produced", "action")
+
+# Separator for multi-valued relationship columns in CSV uploads
+CSV_LIST_SEPARATOR = "|"
+
+
+class RecordError(NamedTuple):
+    """Stands in for a record that couldn't be read, e.g. invalid JSON."""
+    message: str
+
+
+def _decode(line: bytes):
+    try:
+        return line.decode("utf-8").rstrip("\r")
+    except UnicodeDecodeError as exc:
+        return RecordError(f"Invalid UTF-8: {exc}")
+
+
+async def iter_lines(stream: AsyncIterator[bytes]):
+    """Yield `(line_number, text or RecordError)` for each line of a streamed body."""
+    buffer = b""
+    number = 0
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            yield number, _decode(line)
+    if buffer:
+        yield number + 1, _decode(buffer)
+
+
+def _csv_record(header: List[str], row: List[str]) -> dict:
+    record = {key: value for key, value in zip(header, row) if value != ""}
+    for field in RELATIONS:
+        if field in record:
+            record[field] = [name.strip() for name in record[field].split(CSV_LIST_SEPARATOR) if name.strip()]
+    return record
+
+
+async def _iter_csv(stream: AsyncIterator[bytes]):
+    """
+    CSV records of a streamed body, read by one `csv.reader`. A quoted field
+    may span lines (as in GET /firearm/export), so lines are buffered until
+    their quotes balance; the record is numbered by its first line.
+    """
+    pending = deque()
+    quotes = 0
+    first = None
+    header = None
+
+    def buffered():
+        while True:
+            yield pending.popleft()
+
+    reader = csv.reader(buffered())
+    async for number, line in iter_lines(stream):
+        if isinstance(line, RecordError):
+            # Drop the record this line belonged to
+            pending.clear()
+            quotes = 0
+            yield number, line
+            continue
+        if not pending:
+            if not line.strip():
+                continue
+            first = number
+        pending.append(line + "\n")
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        quotes = 0
+        try:
+            row = next(reader)
+        except (csv.Error, IndexError) as exc:
+            # IndexError: a stray quote left the reader wanting more lines
+            pending.clear()
+            reader = csv.reader(buffered())
+            yield first, RecordError(f"Invalid CSV: {exc if isinstance(exc, csv.Error) else 'unbalanced quotes'}")
+            continue
+        if header is None:
+            header = [column.strip() for column in row]
+            continue
+        yield first, _csv_record(header, row)
+    if pending:
+        yield first, RecordError("Invalid CSV: unterminated quoted field")
+
+
+async def iter_records(stream: AsyncIterator[bytes], fmt: str):
+    """Yield `(line_number, dict or RecordError)` for each record of an NDJSON or CSV upload."""
+    if fmt == "csv":
+        async for number, record in _iter_csv(stream):
+            yield number, record
+        return
+    async for number, line in iter_lines(stream):
+        if isinstance(line, RecordError):
+            yield number, line
+        elif line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                yield number, RecordError(f"Invalid JSON: {exc}")
+
+
+def _insert(db, table):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+
+async def _resolve_lookups(db, model, names) -> Dict[str, int]:
+    """Create whichever of `names` don't exist yet, then return name -> id for all of them."""
+    pk = model.__mapper__.primary_key[0]
+    await db.execute(_insert(db, model).values([{"name": name} for name in names]).on_conflict_do_nothing(index_elements=["name"]))
+    rows = await db.execute(select(model.name, pk).where(model.name.in_(names)))
+    return dict(rows.all())
+
+
+async def _write_chunk(db, chunk: List[Tuple[int, schemas.FirearmImport]]) -> int:
+    """Upsert one chunk of firearms and their relationships with set-based statements."""
+    lookup_ids = {}
+    for field, (model, _, _) in RELATIONS.items():
+        names = sorted({name for _, record in chunk for name in getattr(record, field)})
+        lookup_ids[field] = await _resolve_lookups(db, model, names) if names else {}
+
+    stmt = _insert(db, models.Firearm).values([
+        {"name": record.name, **{column: getattr(record, column) for column in COLUMNS}}
+        for _, record in chunk
+    ])
+    # Blank fields in the upload leave existing values alone
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={column: func.coalesce(stmt.excluded[column], getattr(models.Firearm, column)) for column in COLUMNS},
+    ).returning(models.Firearm.name, models.Firearm.firearm_id)
+    firearm_ids = dict((await db.execute(stmt)).all())
+
+    for field, (_, junction, key) in RELATIONS.items():
+        links = {
+            (firearm_ids[record.name], lookup_ids[field][name])
+            for _, record in chunk
+            for name in getattr(record, field)
+        }
+        if links:
+            await db.execute(
+                _insert(db, junction)
+                .values([{"firearm_id": firearm_id, key: lookup_id} for firearm_id, lookup_id in sorted(links)])
+                .on_conflict_do_nothing()
+            )
+
+    await documents.refresh(db, firearm_ids.values())
+    await versioning.bump(db)
+    return len(firearm_ids)
+
+
+async def import_firearms(db, stream: AsyncIterator[bytes], fmt: str) -> dict:
+    """
+    Load a streamed NDJSON or CSV upload of firearms.
+
+    Records are validated one by one and written in transactions of
+    `BULK_IMPORT_CHUNK_SIZE` rows. Firearms are upserted by name and missing
+    types, wars, cartridges, manufacturers and variants are created, so a
+    re-run of the same file is harmless. A failing chunk is rolled back and
+    its rows reported; the import carries on with the next one.
+    """
+    rows = 0
+    imported = 0
+    errors = []
+    chunk = []
+    seen = {}
+
+    async def flush():
+        nonlocal imported
+        try:
+            imported += await _write_chunk(db, chunk)
+            await db.commit()
+        except SQLAlchemyError as exc:
+            await db.rollback()
+            message = str(getattr(exc, "orig", exc)).splitlines()[0]
+            errors.extend({"line": line, "name": record.name, "error": message} for line, record in chunk)
+        chunk.clear()
+        seen.clear()
+
+    async for line, record in iter_records(stream, fmt):
+        rows += 1
+        if isinstance(record, RecordError):
+            errors.append({"line": line, "name": None, "error": record.message})
+            continue
+        try:
+            record = schemas.FirearmImport.model_validate(record)
+        except ValidationError as exc:
+            name = record.get("name") if isinstance(record, dict) else None
+            errors.append({"line": line, "name": name, "error": exc.errors()[0]["msg"]})
+            continue
+        # One multi-row upsert can't touch the same firearm twice
+        if record.name in seen:
+            errors.append({"line": line, "name": record.name, "error": f"Duplicate of line {seen[record.name]}"})
+            continue
+        seen[record.name] = line
+        chunk.append((line, record))
+        if len(chunk) >= settings.BULK_IMPORT_CHUNK_SIZE:
+            await flush()
+
+    if chunk:
+        await flush()
+
+    return {"rows": rows, "imported": imported, "failed": len(errors), "errors": errors}
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Tuple
+
+from sqlalchemy import select
+
+from app import counting, models, response_cache, schemas, snapshot, versioning
+from app.config import settings
+
+
+class LRUCache:
+    """
+    Thread-safe cache with a per-entry TTL and LRU eviction.
+
+    Lives at module level, so a warm Lambda container keeps it across
+    invocations. Callers read through it: `get`, and on a miss load the value
+    and `put` it.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        """The cached value, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class LookupTable(NamedTuple):
+    """A whole lookup table, as response schemas ordered by primary key."""
+    rows: Tuple
+    by_id: Dict[int, object]
+
+
+LOOKUP_SCHEMAS = {
+    models.Type: schemas.Type,
+    models.War: schemas.War,
+    models.Cartridge: schemas.Cartridge,
+    models.Manufacturer: schemas.Manufacturer,
+    models.Variant: schemas.Variant,
+}
+
+lookup_cache = LRUCache(settings.LOOKUP_CACHE_MAX_ENTRIES, settings.LOOKUP_CACHE_TTL)
+
+
+async def lookup_table(db, model) -> LookupTable:
+    """Return every row of a lookup table, loading it through `db` on a cache miss."""
+    # Keyed by catalog version so writes made by other containers are picked up too
+    key = (model.__tablename__, await versioning.current(db))
+    table = lookup_cache.get(key)
+    if table is None:
+        schema = LOOKUP_SCHEMAS[model]
+        pk = model.__mapper__.primary_key[0]
+        result = await db.execute(select(model).order_by(pk))
+        rows = tuple(schema.model_validate(row) for row in result.scalars())
+        table = LookupTable(rows, {getattr(row, pk.key): row for row in rows})
+        lookup_cache.put(key, table)
+    return table
+
+
+def invalidate_catalog():
+    """Drop every process-local catalog cache. Call after each admin write."""
+    lookup_cache.clear()
+    response_cache.response_cache.clear()
+    counting.invalidate()
+    snapshot.forget()
+    versioning.forget()
@@ -0,0 +1,35 @@
+"""
+Maintenance commands.
+
+    python -m app.cli rebuild-documents    # recreate every row of firearm_documents
+
+They use the same DB_* / DATABASE_URL settings as the API.
+"""
+import argparse
+import asyncio
+
+from app import cache, documents
+from app.database import new_session
+
+
+async def rebuild_documents(chunk_size: int) -> int:
+    async with new_session() as db:
+        count = await documents.rebuild_all(db, chunk_size)
+    cache.invalidate_catalog()
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild-documents", help="recreate the stored firearm documents from the normalized tables")
+    rebuild.add_argument("--chunk-size", type=int, default=500, help="firearms per transaction")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild-documents":
+        count = asyncio.run(rebuild_documents(args.chunk_size))
+        print(f"Rebuilt {count} firearm documents")
+
+
+if __name__ == "__main__":
+    main()
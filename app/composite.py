@@ -0,0 +1,169 @@
+import asyncio
+import inspect
+from typing import List, Tuple
+
+import orjson
+from fastapi import HTTPException
+
+from app import rate_limit, schemas
+from app.config import settings
+from app.database import shared_session
+
+PREFIX = "/api/v1/"
+# Passed on from the batch request to every sub-request
+FORWARDED_HEADERS = (b"authorization", b"x-api-key", b"x-forwarded-for")
+# Sub-responses go into a JSON envelope, so they are never compressed
+DROPPED_HEADERS = {"accept-encoding", "content-length", "host"}
+RESPONSE_HEADERS_SKIPPED = {"content-length", "server-timing", "vary"}
+# Session methods that run SQL, and the databases where a failed statement
+# aborts the transaction, which then has to be rolled back
+STATEMENT_METHODS = {"execute", "scalar", "scalars", "get", "get_one", "refresh"}
+ROLLBACK_DIALECTS = {"postgresql"}
+
+
+class SharedSession:
+    """
+    One request's AsyncSession shared by concurrent sub-requests.
+
+    A session (and its single connection) runs one statement at a time, so
+    every awaitable session method takes turns under a lock; everything else
+    a sub-request does (routing, cache hits, snapshot reads, serialization)
+    overlaps. All sub-requests read within the same transaction.
+
+    Sub-requests are GETs, so statements run without savepoints. On
+    PostgreSQL a failed statement aborts the whole transaction; it is then
+    rolled back before the next statement runs, so a failing sub-request
+    doesn't fail its siblings. Objects they already loaded are detached
+    first and keep their values. Streaming results would hold the
+    connection past the lock and aren't supported.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self._lock = asyncio.Lock()
+        self._rollback = session.get_bind().dialect.name in ROLLBACK_DIALECTS
+
+    def __getattr__(self, name):
+        if name in ("stream", "stream_scalars"):
+            raise TypeError("Streaming results can't share a batch session")
+        attr = getattr(self._session, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def locked(*args, **kwargs):
+            async with self._lock:
+                try:
+                    return await attr(*args, **kwargs)
+                except Exception:
+                    if self._rollback and name in STATEMENT_METHODS:
+                        # A rollback would expire everything siblings loaded
+                        self._session.expunge_all()
+                        await self._session.rollback()
+                    raise
+
+        return locked
+
+
+def cost(item: schemas.CompositeItem) -> int:
+    path = item.path.split("?", 1)[0]
+    if rate_limit.request_kind(item.method, path) == "search":
+        return settings.COMPOSITE_SEARCH_COST
+    return 1
+
+
+def check(items: List[schemas.CompositeItem]):
+    """Reject the whole batch up front if it is empty, too large or asks for something unsupported."""
+    if not items:
+        raise HTTPException(status_code=400, detail="At least one request is required")
+    if len(items) > settings.COMPOSITE_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.COMPOSITE_MAX_REQUESTS} requests per batch")
+    for item in items:
+        path = item.path.split("?", 1)[0]
+        if not path.startswith(PREFIX) or path.rstrip("/").endswith("/export"):
+            raise HTTPException(status_code=400, detail=f"Unsupported path {item.path!r}")
+    total = sum(cost(item) for item in items)
+    if total > settings.COMPOSITE_MAX_COST:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch cost {total} exceeds {settings.COMPOSITE_MAX_COST} (searches cost {settings.COMPOSITE_SEARCH_COST})",
+        )
+
+
+def _scope(parent: dict, item: schemas.CompositeItem) -> dict:
+    path, _, query = item.path.partition("?")
+    headers = [(key, value) for key, value in parent.get("headers", []) if key in FORWARDED_HEADERS]
+    headers += [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in item.headers.items() if name.lower() not in DROPPED_HEADERS
+    ]
+    return {
+        "type": "http",
+        "asgi": parent.get("asgi", {"version": "3.0"}),
+        "http_version": parent.get("http_version", "1.1"),
+        "method": item.method,
+        "scheme": parent.get("scheme", "http"),
+        "server": parent.get("server"),
+        "client": parent.get("client"),
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": headers,
+        "state": {},
+    }
+
+
+async def _call(app, scope: dict) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """Run one sub-request through the whole app, middleware included. Returns (status, headers, body)."""
+    start = None
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal start
+        if message["type"] == "http.response.start":
+            start = message
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        # Starlette re-raises after sending its 500 response
+        if start is None:
+            return 500, [(b"content-type", b"application/json")], b'{"detail":"Internal Server Error"}'
+    return start["status"], list(start.get("headers", [])), b"".join(chunks)
+
+
+def _envelope_item(id: str, status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> bytes:
+    kept = {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in headers if name.decode("latin-1") not in RESPONSE_HEADERS_SKIPPED
+    }
+    if not body:
+        raw = b"null"
+    elif kept.get("content-type", "").startswith("application/json"):
+        # Already JSON: splice it in rather than parsing and re-encoding it
+        raw = body
+    else:
+        raw = orjson.dumps(body.decode("utf-8", "replace"))
+    return orjson.dumps({"id": id, "status": status, "headers": kept})[:-1] + b',"body":' + raw + b"}"
+
+
+async def run(app, parent_scope: dict, items: List[schemas.CompositeItem], db) -> bytes:
+    """
+    Run `items` concurrently against `app` on the one session `db`, and
+    return the `{ responses }` envelope as JSON bytes.
+    """
+    token = shared_session.set(SharedSession(db))
+    try:
+        results = await asyncio.gather(*(_call(app, _scope(parent_scope, item)) for item in items))
+    finally:
+        shared_session.reset(token)
+    parts = [
+        _envelope_item(item.id if item.id is not None else str(position), *result)
+        for position, (item, result) in enumerate(zip(items, results))
+    ]
+    return b'{"responses":[' + b",".join(parts) + b"]}"
@@ -0,0 +1,198 @@
+import zlib
+from typing import Callable, Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+
+from app.cache import LRUCache
+from app.config import settings
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class Encoding:
+    """
+    One content coding: `compress(body, level)` for whole bodies and
+    `stream(level)` returning (process, finish) for streamed ones.
+    `level` is the fast level for responses compressed once per request and
+    `cached_level` the tighter one for responses that are compressed once and
+    then served from `compressed_cache` many times.
+    """
+
+    def __init__(self, name: str, compress: Callable, stream: Callable, level: int, cached_level: int):
+        self.name = name
+        self.compress = compress
+        self.stream = stream
+        self.level = level
+        self.cached_level = cached_level
+
+
+def _gzip_stream(level):
+    compressor = zlib.compressobj(level, wbits=31)
+    return compressor.compress, compressor.flush
+
+
+def _load_encodings() -> Dict[str, Encoding]:
+    """gzip always; brotli and zstd when their (optional) packages are installed."""
+    encodings = {}
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        def _zstd_stream(level):
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            return compressor.compress, compressor.flush
+
+        encodings["zstd"] = Encoding(
+            "zstd", lambda body, level: zstandard.ZstdCompressor(level=level).compress(body), _zstd_stream, 3, 12,
+        )
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        def _brotli_stream(level):
+            compressor = brotli.Compressor(quality=level)
+            return compressor.process, compressor.finish
+
+        encodings["br"] = Encoding("br", lambda body, level: brotli.compress(body, quality=level), _brotli_stream, 4, 9)
+    encodings["gzip"] = Encoding("gzip", lambda body, level: zlib.compress(body, level, wbits=31), _gzip_stream, 6, 9)
+    return encodings
+
+
+_encodings = None
+
+
+def available_encodings() -> Dict[str, Encoding]:
+    """
+    The encodings this container can produce, best first. brotli and zstd are
+    only imported when the first response is compressed, so they don't add to
+    cold starts.
+    """
+    global _encodings
+    if _encodings is None:
+        _encodings = _load_encodings()
+    return _encodings
+
+# Compressed bodies of cacheable responses by (URL, encoding, ETag). The ETag
+# is derived from the catalog version (app/conditional.py), so a write moves
+# every page to a new key instead of serving stale bytes.
+compressed_cache = LRUCache(settings.COMPRESSION_CACHE_MAX_ENTRIES, settings.COMPRESSION_CACHE_TTL)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[Encoding]:
+    """The best available encoding the client accepts, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        weight = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    weight = float(param[2:])
+                except ValueError:
+                    weight = 0.0
+        weights[name.lower()] = weight
+    best = None
+    # Ties go to the first of zstd, br, gzip
+    for name, encoding in available_encodings().items():
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > 0 and (best is None or weight > best[0]):
+            best = (weight, encoding)
+    return best[1] if best else None
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    return "content-encoding" not in headers and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Compress successful responses of at least `COMPRESSION_MIN_SIZE` bytes
+    with the best encoding the client accepts (zstd, br or gzip).
+
+    Responses that already have a `Content-Encoding` (e.g. `GET
+    /firearm/export?gzip=true`) pass through untouched; streamed bodies are
+    compressed as they stream. Bodies of responses with an ETag are kept in
+    `compressed_cache`, so a hot page is compressed once per catalog version.
+    Compressed responses get a weak ETag, which `If-None-Match` still matches.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = None
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        if not accept_encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        stream = None
+
+        async def send_compressed(message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                # Hold the headers back until the first body chunk shows the size
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            if stream is not None:
+                process, finish = stream
+                body = process(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body += finish()
+                if body or not message.get("more_body", False):
+                    await send({"type": "http.response.body", "body": body, "more_body": message.get("more_body", False)})
+                return
+
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            compress = start["status"] == 200 and _compressible(headers) and (more_body or len(body) >= settings.COMPRESSION_MIN_SIZE)
+            encoding = negotiate(accept_encoding) if compress else None
+            if encoding is None:
+                await send(start)
+                await send(message)
+                start = None
+                return
+
+            del headers["content-length"]
+            headers["content-encoding"] = encoding.name
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag is not None and not etag.startswith("W/"):
+                headers["etag"] = "W/" + etag
+
+            if more_body:
+                stream = encoding.stream(encoding.level)
+                await send({**start, "headers": headers.raw})
+                chunk = stream[0](body)
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                return
+
+            if etag is not None:
+                key = (scope["path"], scope.get("query_string", b""), encoding.name, etag)
+                compressed = compressed_cache.get(key)
+                if compressed is None:
+                    compressed = encoding.compress(body, encoding.cached_level)
+                    compressed_cache.put(key, compressed)
+            else:
+                compressed = encoding.compress(body, encoding.level)
+            headers["content-length"] = str(len(compressed))
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
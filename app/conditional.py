@@ -0,0 +1,72 @@
+import hashlib
+
+from fastapi import Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import versioning
+from app.config import settings
+from app.database import get_db
+
+
+class NotModified(Exception):
+    """Raised by `conditional_get` when the client already has the current representation."""
+
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers=exc.headers)
+
+
+async def conditional_get(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Router dependency giving anonymous GETs a strong ETag derived from the
+    catalog version and the request URL.
+
+    A matching `If-None-Match` short-circuits with 304 before the handler
+    runs, so nothing is queried (the version is cached, see
+    `versioning.current`) or serialized. Otherwise the headers are left in the
+    request state for `CacheHeadersMiddleware`, which also covers handlers
+    that return a ready-made `Response`.
+    """
+    if request.method != "GET" or "authorization" in request.headers:
+        return
+
+    version = await versioning.current(db)
+    digest = hashlib.sha256(f"{version}:{request.url.path}?{request.url.query}".encode()).hexdigest()
+    headers = {
+        "ETag": f'"{digest[:32]}"',
+        "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE}",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if headers["ETag"] in tags or "*" in tags:
+            raise NotModified(headers)
+
+    request.state.cache_headers = headers
+
+
+class CacheHeadersMiddleware:
+    """Add the headers `conditional_get` computed to successful responses."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = scope.get("state", {}).get("cache_headers")
+                if headers:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (name.lower().encode(), value.encode()) for name, value in headers.items()
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
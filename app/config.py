@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 
 load_dotenv()
@@ -11,8 +12,98 @@ class Settings(BaseSettings):
     DB_PORT: str = os.getenv("DB_PORT")
 
     DB_PASSWORD: str = os.getenv("DB_PASSWORD")
+    # Full SQLAlchemy URL; overrides the DB_* settings above (e.g. SQLite for local runs)
+    DATABASE_URL: Optional[str] = os.getenv("DATABASE_URL")
+
+    # Connection pool: "null" opens a connection per session (use behind RDS
+    # Proxy), "queue" keeps a bounded pool (long-running servers), "static"
+    # reuses one connection (one request at a time, e.g. Lambda without a proxy)
+    DB_POOL_MODE: Literal["null", "queue", "static"] = "queue"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # How long a container trusts a token it has verified against the users
+    # table, and how often it re-checks the revocation epoch: a revocation
+    # reaches other containers within REVOCATION_CHECK_TTL seconds
+    PRINCIPAL_CACHE_TTL: int = 30
+    REVOCATION_CHECK_TTL: int = 5
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 1024
+
+    # Token buckets per client (API key, token subject or IP) and request kind,
+    # see app/rate_limit.py. Storage is "memory" or a redis://, rediss:// or
+    # unix:// URL shared by all containers. Clients with a known API key or
+    # valid token get FACTOR times the anonymous budget.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE: str = "memory"
+    RATE_LIMIT_READ_PER_SECOND: float = 20
+    RATE_LIMIT_READ_BURST: int = 100
+    RATE_LIMIT_SEARCH_PER_SECOND: float = 2
+    RATE_LIMIT_SEARCH_BURST: int = 20
+    RATE_LIMIT_WRITE_PER_SECOND: float = 1
+    RATE_LIMIT_WRITE_BURST: int = 20
+    RATE_LIMIT_AUTHENTICATED_FACTOR: int = 5
+    # Comma-separated API keys charged as their own clients; other X-Api-Key
+    # values count only when API Gateway has validated them
+    RATE_LIMIT_API_KEYS: str = ""
+    # Take the client IP from X-Forwarded-For (only behind a proxy that sets it)
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+
+    # Per-request metrics (app/observability.py): GET /metrics for Prometheus
+    # when running as a server; under Lambda they go to CloudWatch as EMF logs
+    METRICS_ENDPOINT: bool = not os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+    METRICS_NAMESPACE: str = "FirearmDB"
+
+    # Final bytes of anonymous GET responses (app/response_cache.py), bounded
+    # by total size. With a spill directory (e.g. /tmp/firearmdb-responses)
+    # entries also survive a handler restart within the container.
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 2 * 1024 * 1024
+    RESPONSE_CACHE_SPILL_DIR: str = ""
+
+    # Response compression (app/compression.py): bodies smaller than
+    # COMPRESSION_MIN_SIZE bytes are sent as they are. Compressed bodies of
+    # cacheable responses are kept per URL, encoding and catalog version.
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_CACHE_MAX_ENTRIES: int = 256
+    COMPRESSION_CACHE_TTL: int = 3600
+
+    # Totals for paginated responses
+    COUNT_CACHE_TTL: int = 60
+    COUNT_ESTIMATE_THRESHOLD: int = 100000
+
+    # pg_trgm similarity a name needs to match a search term it doesn't contain
+    SEARCH_SIMILARITY_THRESHOLD: float = 0.3
+
+    # Process-local cache of the lookup tables (types, wars, cartridges, ...)
+    LOOKUP_CACHE_TTL: int = 300
+    LOOKUP_CACHE_MAX_ENTRIES: int = 64
+
+    # How long a container trusts its copy of the catalog version, and how
+    # long clients/CDNs may cache anonymous GETs
+    VERSION_CHECK_TTL: int = 5
+    HTTP_CACHE_MAX_AGE: int = 60
+
+    # Rows per transaction in POST /firearm/bulk
+    BULK_IMPORT_CHUNK_SIZE: int = 500
+    # Serve firearm GETs from an in-memory snapshot of the catalog (app/snapshot.py)
+    SNAPSHOT_MODE: bool = False
+    # Where snapshots are shared between containers: a local path or s3://bucket/key; empty to skip
+    SNAPSHOT_PATH: str = "/tmp/firearmdb-snapshot.json"
+    # Most ids accepted by one /…/batch request
+    BATCH_MAX_IDS: int = 100
+    # POST /batch (app/composite.py): most sub-requests per call, and their
+    # total cost (1 per read, COMPOSITE_SEARCH_COST per search)
+    COMPOSITE_MAX_REQUESTS: int = 20
+    COMPOSITE_MAX_COST: int = 40
+    COMPOSITE_SEARCH_COST: int = 5
+    # Firearms per server-side cursor batch in GET /firearm/export
+    EXPORT_BATCH_SIZE: int = 1000
 
 settings = Settings()
\ No newline at end of file
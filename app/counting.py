@@ -0,0 +1,63 @@
+import threading
+import time
+
+from sqlalchemy import func, select, text
+
+from app.config import settings
+
+MAX_ENTRIES = 1024
+
+_lock = threading.Lock()
+_cache = {}
+
+
+async def _estimate(db, table: str):
+    """Planner row estimate for a whole table, or None when the dialect has no statistics."""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    estimate = (await db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table},
+    )).scalar()
+    # reltuples is -1 for a table that has never been analyzed
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
+
+
+async def count_rows(db, stmt):
+    """
+    Return `(total, estimated)` for the rows matched by the select `stmt`.
+
+    Unfiltered queries on large Postgres tables use the planner's `reltuples`
+    estimate. Everything else gets an exact COUNT(*), cached per table and
+    filter for `COUNT_CACHE_TTL` seconds.
+    """
+    table = stmt.column_descriptions[0]["entity"].__table__.name
+
+    if stmt.whereclause is None:
+        estimate = await _estimate(db, table)
+        if estimate is not None and estimate >= settings.COUNT_ESTIMATE_THRESHOLD:
+            return estimate, True
+
+    compiled = stmt.compile()
+    key = (table, str(compiled), tuple(sorted(compiled.params.items())))
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+    if hit is not None and hit[0] > now:
+        return hit[1], False
+
+    total = (await db.execute(select(func.count()).select_from(stmt.order_by(None).subquery()))).scalar()
+    with _lock:
+        if len(_cache) >= MAX_ENTRIES:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = (now + settings.COUNT_CACHE_TTL, total)
+    return total, False
+
+
+def invalidate(table: str = None):
+    """Drop cached counts for `table`, or for every table when none is given."""
+    with _lock:
+        for key in [k for k in _cache if table is None or k[0] == table]:
+            del _cache[key]
@@ -1,25 +1,134 @@
-from .config import Settings
+import threading
+from contextvars import ContextVar
+
+from .config import settings
+from . import observability, pool_metrics
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
 from urllib.parse import quote_plus
 
 
-settings = Settings()
-engine = create_engine(
-    f"postgresql://{settings.DB_USER}:{quote_plus(settings.DB_PASSWORD)}@{settings.DB_SERVER}:{settings.DB_PORT}/{settings.DB_NAME}?sslmode=require"
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sessions are bound on first use, so importing the app (e.g. on a Lambda
+# cold start) doesn't load the DBAPI driver or build a pool.
+#
+# The API runs on the async engine (asyncpg, aiosqlite for tests). The sync
+# engine is kept for scripts and command-line tools.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+SYNC_DRIVERS = {"postgresql": "postgresql", "sqlite": "sqlite"}
+
+
+def database_url():
+    if settings.DATABASE_URL:
+        return settings.DATABASE_URL
+    return f"postgresql://{settings.DB_USER}:{quote_plus(settings.DB_PASSWORD)}@{settings.DB_SERVER}:{settings.DB_PORT}/{settings.DB_NAME}?sslmode=require"
+
+
+def pool_options(mode: str = None, is_async: bool = False) -> dict:
+    """`create_engine` keyword arguments for a `DB_POOL_MODE`."""
+    mode = mode or settings.DB_POOL_MODE
+    if mode == "null":
+        return {"poolclass": pool_metrics.timed(NullPool)}
+    if mode == "static":
+        return {"poolclass": pool_metrics.timed(StaticPool), "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if mode == "queue":
+        return {
+            "poolclass": pool_metrics.timed(AsyncAdaptedQueuePool if is_async else QueuePool),
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        }
+    raise ValueError(f"Unknown DB_POOL_MODE {mode!r}")
+
+
+def _engine_args(url, mode, is_async):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    drivers = ASYNC_DRIVERS if is_async else SYNC_DRIVERS
+    if backend in drivers:
+        url = url.set(drivername=drivers[backend])
+    options = pool_options(mode, is_async)
+    if backend == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    elif is_async and url.query.get("sslmode"):
+        # asyncpg takes `ssl` rather than libpq's `sslmode`
+        options["connect_args"] = {"ssl": url.query["sslmode"]}
+        url = url.difference_update_query(["sslmode"])
+    return url, options
+
+
+def build_engine(url: str = None, mode: str = None):
+    url, options = _engine_args(url or database_url(), mode, is_async=False)
+    engine = create_engine(url, **options)
+    pool_metrics.attach(engine)
+    observability.attach(engine)
+    return engine
 
 
+def build_async_engine(url: str = None, mode: str = None):
+    url, options = _engine_args(url or database_url(), mode, is_async=True)
+    engine = create_async_engine(url, **options)
+    pool_metrics.attach(engine.sync_engine)
+    observability.attach(engine.sync_engine)
+    return engine
 
 
+def get_engine():
+    """Create the sync engine on first call and bind `SessionLocal` to it."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = build_engine()
+                SessionLocal.configure(bind=_engine)
+    return _engine
 
+
+def get_async_engine():
+    """Create the async engine on first call and bind `AsyncSessionLocal` to it."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = build_async_engine()
+                AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+
+def __getattr__(name):
+    # `from app.database import engine` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
+
+
+def new_session() -> AsyncSession:
+    """An AsyncSession on the app's engine, for work outside a request's `get_db` (e.g. streaming)."""
+    get_async_engine()
+    return AsyncSessionLocal()
+
+
+# Set by POST /batch (app/composite.py) so its sub-requests share one session
+shared_session: ContextVar = ContextVar("shared_session", default=None)
+
+
+async def get_db():
+    shared = shared_session.get()
+    if shared is not None:
+        yield shared
+        return
+    async with new_session() as db:
+        yield db
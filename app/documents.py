@@ -0,0 +1,79 @@
+from typing import Dict, List, Sequence
+
+from sqlalchemy import Text, cast, delete, insert, select
+
+from app import includes, models, schemas
+
+FULL = includes.plan(includes.FULL_INCLUDE)
+
+
+async def build(db, ids: Sequence[int]) -> Dict[int, dict]:
+    """Render the full documents of the firearms in `ids` (those that exist) from the normalized tables."""
+    # populate_existing: the session may already hold these firearms from before the write
+    result = await db.execute(
+        select(models.Firearm).where(models.Firearm.firearm_id.in_(ids)).options(*FULL.options())
+        .execution_options(populate_existing=True)
+    )
+    return {
+        firearm.firearm_id: schemas.FirearmExpanded.model_validate(FULL.expand(firearm)).model_dump(mode="json")
+        for firearm in result.scalars()
+    }
+
+
+async def refresh(db, ids: Sequence[int]):
+    """
+    Rewrite the stored documents of `ids` inside the caller's transaction.
+
+    Call it from every write that touches a firearm or its links, after a
+    flush, so the documents commit (or roll back) with the change.
+    Firearms that no longer exist just lose their document.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    documents = await build(db, ids)
+    await db.execute(delete(models.FirearmDocument).where(models.FirearmDocument.firearm_id.in_(ids)))
+    if documents:
+        await db.execute(insert(models.FirearmDocument), [
+            {"firearm_id": firearm_id, "document": document} for firearm_id, document in documents.items()
+        ])
+
+
+async def rebuild_all(db, chunk_size: int = 500) -> int:
+    """Recreate every stored document, committing per chunk. Returns how many were written."""
+    await db.execute(delete(models.FirearmDocument).where(
+        models.FirearmDocument.firearm_id.not_in(select(models.Firearm.firearm_id))
+    ))
+    ids = (await db.execute(select(models.Firearm.firearm_id).order_by(models.Firearm.firearm_id))).scalars().all()
+    for start in range(0, len(ids), chunk_size):
+        await refresh(db, ids[start:start + chunk_size])
+        await db.commit()
+    await db.commit()
+    return len(ids)
+
+
+async def read_raw(db, ids: Sequence[int]) -> Dict[int, bytes]:
+    """
+    The stored JSON of each firearm in `ids` that has a document, by primary key.
+
+    The JSON comes back as text and is passed through as bytes, with no ORM
+    objects or schema validation in between.
+    """
+    rows = await db.execute(
+        select(models.FirearmDocument.firearm_id, cast(models.FirearmDocument.document, Text))
+        .where(models.FirearmDocument.firearm_id.in_(ids))
+    )
+    return {firearm_id: document.encode() for firearm_id, document in rows}
+
+
+async def read(db, ids: List[int]) -> Dict[int, bytes]:
+    """
+    Like `read_raw`, but firearms without a stored document yet (e.g. before
+    the first `python -m app.cli rebuild-documents`) are rendered on the fly.
+    """
+    found = await read_raw(db, ids)
+    absent = [firearm_id for firearm_id in ids if firearm_id not in found]
+    if absent:
+        for firearm_id, document in (await build(db, absent)).items():
+            found[firearm_id] = schemas.FirearmExpanded.model_validate(document).model_dump_json().encode()
+    return found
@@ -0,0 +1,95 @@
+import csv
+import io
+import zlib
+from collections import defaultdict
+from typing import AsyncIterator, Dict, List
+
+import orjson
+from sqlalchemy import select
+
+from app import models
+from app.bulk_import import COLUMNS, CSV_LIST_SEPARATOR, RELATIONS
+from app.config import settings
+from app.database import new_session
+
+CSV_HEADER = ("firearm_id", "name", *COLUMNS, *RELATIONS)
+
+
+async def _related_names(db, first_id: int, last_id: int) -> Dict[str, Dict[int, List[str]]]:
+    """Names of each relationship for the firearms in `[first_id, last_id]`, one range query per junction table."""
+    related = {}
+    for field, (model, junction, key) in RELATIONS.items():
+        pk = model.__mapper__.primary_key[0]
+        rows = await db.execute(
+            select(junction.c.firearm_id, model.name)
+            .join(model, pk == junction.c[key])
+            .where(junction.c.firearm_id.between(first_id, last_id))
+            .order_by(junction.c.firearm_id, model.name)
+        )
+        names = defaultdict(list)
+        for firearm_id, name in rows:
+            names[firearm_id].append(name)
+        related[field] = names
+    return related
+
+
+async def iter_firearms(db, batch_size: int = None) -> AsyncIterator[List[dict]]:
+    """
+    Yield every firearm, with its related names, in batches ordered by id.
+
+    Firearm rows come through a server-side cursor, so memory stays flat
+    however big the catalog is. Relationships are fetched per batch with a
+    range scan over each junction table's `firearm_id`.
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    columns = [models.Firearm.firearm_id, models.Firearm.name, *(getattr(models.Firearm, c) for c in COLUMNS)]
+    result = await db.stream(
+        select(*columns).order_by(models.Firearm.firearm_id).execution_options(yield_per=batch_size)
+    )
+    async for partition in result.partitions():
+        related = await _related_names(db, partition[0].firearm_id, partition[-1].firearm_id)
+        yield [
+            {**row._asdict(), **{field: related[field].get(row.firearm_id, []) for field in RELATIONS}}
+            for row in partition
+        ]
+
+
+def _ndjson(batch: List[dict]) -> bytes:
+    return b"".join(orjson.dumps(record) + b"\n" for record in batch)
+
+
+def _csv(batch: List[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for record in batch:
+        writer.writerow([
+            CSV_LIST_SEPARATOR.join(value) if isinstance(value, list) else value
+            for value in (record[column] for column in CSV_HEADER)
+        ])
+    return buffer.getvalue().encode("utf-8")
+
+
+async def export_firearms(fmt: str, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Stream the whole firearm catalog as NDJSON or CSV, optionally gzipped.
+
+    The output uses the same fields as the bulk import, so an export can be
+    loaded back with `POST /firearm/bulk`. It opens its own session: a
+    request's `get_db` session is closed before a streaming body is sent.
+    """
+    encode = _csv if fmt == "csv" else _ndjson
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    if fmt == "csv":
+        yield emit(",".join(CSV_HEADER).encode("utf-8") + b"\n")
+    async with new_session() as db:
+        async for batch in iter_firearms(db):
+            chunk = emit(encode(batch))
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
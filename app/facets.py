@@ -0,0 +1,111 @@
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import Integer, String, cast, func, literal, null, select, union_all
+
+from app import cache, models
+from app.bulk_import import RELATIONS
+from app.pagination import DEFAULT_LIMIT, clamp_limit, decode_cursor, encode_cursor
+
+
+def _matched(filters: Dict[str, Sequence[int]]):
+    """Firearm ids linked to any of the given ids in every filtered facet."""
+    stmt = select(models.Firearm.firearm_id)
+    for field, ids in filters.items():
+        _, junction, key = RELATIONS[field]
+        stmt = stmt.where(models.Firearm.firearm_id.in_(
+            select(junction.c.firearm_id).where(junction.c[key].in_(ids))
+        ))
+    return stmt.cte("matched")
+
+
+def build_statement(filters, facets, offset, limit, after=None):
+    """
+    One statement returning `(facet, value, count)` rows: the page's firearm
+    ids under "page", the number of matches under "total", and for each
+    facet the matches per linked id.
+    """
+    matched = _matched(filters)
+    page = select(matched.c.firearm_id).order_by(matched.c.firearm_id)
+    page = page.where(matched.c.firearm_id > after) if after is not None else page.offset(offset)
+    page = page.limit(limit + 1).cte("page")
+
+    parts = [
+        select(literal("page", String).label("facet"), page.c.firearm_id.label("value"), cast(null(), Integer).label("count")),
+        select(literal("total", String), cast(null(), Integer), func.count()).select_from(matched),
+    ]
+    for facet in facets:
+        _, junction, key = RELATIONS[facet]
+        parts.append(
+            select(literal(facet, String), junction.c[key], func.count())
+            .join_from(junction, matched, junction.c.firearm_id == matched.c.firearm_id)
+            .group_by(junction.c[key])
+        )
+    return union_all(*parts)
+
+
+async def filter_firearms(
+    db,
+    filters: Dict[str, Sequence[int]],
+    facets: Sequence[str],
+    offset: int = 0,
+    limit: int = DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+) -> dict:
+    """
+    Filter firearms through the junction tables and count matches per facet value.
+
+    Ids within a facet are alternatives; facets are combined with AND. The
+    page of firearm ids, the total and the per-facet counts all come back
+    from one statement, so a filtered page costs one round trip plus the
+    loading of the page's firearms. Facet counts cover the whole match set,
+    not just the page. Returns a `PaginatedResponse`-shaped dict whose
+    `items` are firearm ids, plus `facets` as facet -> [{id, name, count}].
+    """
+    limit = clamp_limit(limit)
+    offset = max(offset, 0)
+    after = None
+    if cursor is not None:
+        (after,) = decode_cursor(cursor, 1)
+        offset = None
+
+    rows = (await db.execute(build_statement(filters, facets, offset, limit, after))).all()
+
+    ids = sorted(value for facet, value, _ in rows if facet == "page")
+    total = next(count for facet, _, count in rows if facet == "total")
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+
+    counts = {facet: [] for facet in facets}
+    for facet, value, count in rows:
+        if facet in counts:
+            counts[facet].append((value, count))
+    result = {}
+    for facet, values in counts.items():
+        names = (await cache.lookup_table(db, RELATIONS[facet][0])).by_id
+        result[facet] = sorted(
+            ({"id": value, "name": names[value].name if value in names else None, "count": count} for value, count in values),
+            key=lambda item: (-item["count"], item["id"]),
+        )
+
+    return {
+        "items": ids,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": encode_cursor([ids[-1]]) if has_more and ids else None,
+        "facets": result,
+    }
+
+
+async def load_page(db, ids: List[int], plan) -> list:
+    """The firearms for a page of ids, in id order, loaded as `plan` says."""
+    if not ids:
+        return []
+    result = await db.execute(
+        select(models.Firearm)
+        .where(models.Firearm.firearm_id.in_(ids))
+        .order_by(models.Firearm.firearm_id)
+        .options(*plan.options())
+    )
+    return plan.expand_all(result.scalars())
@@ -0,0 +1,113 @@
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+from fastapi import HTTPException
+from pydantic import ConfigDict, create_model
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+from app import models, schemas
+
+# include= names -> Firearm relationship
+FIREARM_RELATIONS = {
+    "types": models.Firearm.types,
+    "wars": models.Firearm.wars,
+    "cartridges": models.Firearm.cartridges,
+    "manufacturers": models.Firearm.manufacturers,
+    "variants": models.Firearm.variants,
+}
+RELATION_SCHEMAS = {
+    "types": schemas.Type,
+    "wars": schemas.War,
+    "cartridges": schemas.Cartridge,
+    "manufacturers": schemas.Manufacturer,
+    "variants": schemas.Variant,
+}
+FIREARM_COLUMNS = ("firearm_id", "name", "designer", "designed", "produced", "action")
+
+# Exactly what schemas.Firearm serializes
+DEFAULT_INCLUDE = "wars,cartridges"
+# Every relationship: the full firearm document (see app/documents.py)
+FULL_INCLUDE = ",".join(FIREARM_RELATIONS)
+
+
+def _split(value: Optional[str], allowed, param: str) -> tuple:
+    names = [part.strip() for part in (value or "").split(",") if part.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {param} {', '.join(unknown)}; expected any of {', '.join(allowed)}",
+        )
+    return tuple(dict.fromkeys(names))
+
+
+@lru_cache(maxsize=256)
+def sparse_schema(columns: tuple, include: tuple):
+    """
+    A response model with just `columns` and the `include`d relationships.
+
+    Columns keep their `schemas.Firearm` definitions. Models are cached per
+    field set, so each one is built (and its serializer compiled) once.
+    """
+    fields = schemas.Firearm.model_fields
+    definitions = {name: (fields[name].annotation, fields[name]) for name in columns}
+    definitions.update({name: (List[RELATION_SCHEMAS[name]], ...) for name in include})
+    return create_model(
+        "FirearmFields",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+class Plan(NamedTuple):
+    """What a firearm response needs: the columns to select, the relationships to load and the schema to render."""
+    columns: tuple
+    include: tuple
+    schema: type
+
+    def options(self) -> list:
+        """
+        Loader options for this plan.
+
+        Each included relationship is loaded with one `IN` query for the whole
+        result, so the statement count doesn't grow with the number of rows.
+        Only the planned columns are selected. Anything else raises if touched
+        instead of quietly lazy-loading.
+        """
+        options = [*(selectinload(FIREARM_RELATIONS[name]) for name in self.include), raiseload("*")]
+        if self.columns != FIREARM_COLUMNS:
+            options.append(load_only(*(getattr(models.Firearm, column) for column in self.columns), raiseload=True))
+        return options
+
+    def expand(self, firearm) -> dict:
+        """A firearm's planned columns and relationships, ready to render."""
+        return {
+            **{column: getattr(firearm, column) for column in self.columns},
+            **{name: getattr(firearm, name) for name in self.include},
+        }
+
+    def expand_all(self, firearms) -> List[dict]:
+        return [self.expand(firearm) for firearm in firearms]
+
+
+def plan(include: Optional[str] = None, fields: Optional[str] = None) -> Plan:
+    """
+    Plan a firearm response from `include=` and `fields=`.
+
+    `include` names relationships to embed (default wars,cartridges).
+    `fields` narrows the response to the listed columns and relationships;
+    `firearm_id` is always returned. Without `fields` the schema is
+    `schemas.Firearm` for the default include, else `FirearmExpanded` with
+    null for relationships left out.
+    """
+    if fields is None:
+        include = _split(DEFAULT_INCLUDE if include is None else include, FIREARM_RELATIONS, "include")
+        if set(include) == {"wars", "cartridges"}:
+            return Plan(FIREARM_COLUMNS, include, schemas.Firearm)
+        return Plan(FIREARM_COLUMNS, include, schemas.FirearmExpanded)
+
+    requested = _split(fields, FIREARM_COLUMNS + tuple(FIREARM_RELATIONS), "field")
+    columns = tuple(column for column in FIREARM_COLUMNS if column == "firearm_id" or column in requested)
+    include = _split(include, FIREARM_RELATIONS, "include")
+    include = tuple(name for name in FIREARM_RELATIONS if name in include or name in requested)
+    return Plan(columns, include, sparse_schema(columns, include))
@@ -1,15 +1,34 @@
 from __future__ import annotations
+import base64
 import os
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 
-from app.routers import firearm, cartridge, firearm_type, war, manufacturer
+from app.routers import firearm, cartridge, firearm_type, war, manufacturer, variant, relationships, admin, composite
 from app.routers import auth as auth_router 
- 
-from mangum import Mangum
+from app import observability
+from app.compression import CompressionMiddleware
+from app.conditional import CacheHeadersMiddleware, NotModified, not_modified_handler
+from app.rate_limit import RateLimitMiddleware
+from app.response_cache import ResponseCacheMiddleware
+from app.config import settings
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # In snapshot mode, load the catalog while the container initializes
+    if settings.SNAPSHOT_MODE:
+        from app import snapshot
+        from app.database import new_session
+        async with new_session() as db:
+            await snapshot.active(db)
+    yield
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+app.add_exception_handler(NotModified, not_modified_handler)
 
 
 
@@ -19,7 +38,17 @@ app.include_router(war.router, prefix="/api/v1")
 app.include_router(auth_router.router, prefix="/api/v1") 
 app.include_router(manufacturer.router, prefix="/api/v1")
 app.include_router(firearm_type.router, prefix="/api/v1")
+app.include_router(variant.router, prefix="/api/v1")
+for relationship_router in relationships.routers:
+    app.include_router(relationship_router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
+app.include_router(composite.router, prefix="/api/v1")
 
+app.add_middleware(CacheHeadersMiddleware)
+# Outside CacheHeadersMiddleware, so stored responses keep their ETag
+app.add_middleware(ResponseCacheMiddleware)
+# Inside CORS, so 429s still carry the CORS headers
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -27,11 +56,48 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outside CacheHeadersMiddleware, so it sees the ETag of cacheable responses
+app.add_middleware(CompressionMiddleware)
+# Outermost, so Server-Timing covers the whole request
+app.add_middleware(observability.TimingMiddleware)
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
-handler = Mangum(app)
+if settings.METRICS_ENDPOINT:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Per-route request, SQL, pool and serialization totals in the Prometheus text format."""
+        return PlainTextResponse(observability.route_stats.prometheus(), media_type="text/plain; version=0.0.4")
+
+# Content types Mangum returns as text (its defaults plus NDJSON exports);
+# anything else, and every body with a Content-Encoding, goes base64 encoded
+TEXT_MIME_TYPES = [
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "application/vnd.api+json",
+    "application/vnd.oai.openapi",
+]
+
+_mangum = None
+
+def handler(event, context):
+    """Lambda entry point. Mangum is only imported when running on Lambda."""
+    global _mangum
+    if _mangum is None:
+        from mangum import Mangum
+        _mangum = Mangum(app, text_mime_types=TEXT_MIME_TYPES)
+        observability.emit_emf = True
+    response = _mangum(event, context)
+    if response.get("body") and not response.get("isBase64Encoded") and "content-encoding" in response.get("headers", {}):
+        # A compressed body Mangum could decode as UTF-8 (it only checks the
+        # type); API Gateway only turns base64 back into the exact bytes
+        response["body"] = base64.b64encode(response["body"].encode()).decode()
+        response["isBase64Encoded"] = True
+    return response
 
 
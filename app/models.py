@@ -1,35 +1,62 @@
-from sqlalchemy import Column, Integer, String, Text, Table, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, Table, ForeignKey, Boolean, Index, DDL, JSON, event
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base 
 from pydantic import BaseModel
 from typing import Optional, List
+# Name searches use trigram GIN indexes (see app/search.py).
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
+
+def trigram_index(table_name):
+    """GIN trigram index on `name`; only created on PostgreSQL."""
+    return Index(
+        f"ix_{table_name}_name_trgm",
+        "name",
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql")
+
 # --- Junction Tables (Association Tables) ---
 # These tables don't need their own class. They are defined here to be used
 # in the 'secondary' argument of the relationships below.
+#
+# The primary key serves lookups by firearm; the reversed (lookup, firearm)
+# index serves filters and relationship pages by lookup id (app/facets.py,
+# app/routers/relationships.py).
 
 firearm_types = Table('firearm_types', Base.metadata,
     Column('firearm_id', Integer, ForeignKey('firearms.firearm_id'), primary_key=True),
-    Column('type_id', Integer, ForeignKey('types.type_id'), primary_key=True)
+    Column('type_id', Integer, ForeignKey('types.type_id'), primary_key=True),
+    Index('ix_firearm_types_type_id_firearm_id', 'type_id', 'firearm_id'),
 )
 
 firearm_wars = Table('firearm_wars', Base.metadata,
     Column('firearm_id', Integer, ForeignKey('firearms.firearm_id'), primary_key=True),
-    Column('war_id', Integer, ForeignKey('wars.war_id'), primary_key=True)
+    Column('war_id', Integer, ForeignKey('wars.war_id'), primary_key=True),
+    Index('ix_firearm_wars_war_id_firearm_id', 'war_id', 'firearm_id'),
 )
 
 firearm_cartridges = Table('firearm_cartridges', Base.metadata,
     Column('firearm_id', Integer, ForeignKey('firearms.firearm_id'), primary_key=True),
-    Column('cartridge_id', Integer, ForeignKey('cartridges.cartridge_id'), primary_key=True)
+    Column('cartridge_id', Integer, ForeignKey('cartridges.cartridge_id'), primary_key=True),
+    Index('ix_firearm_cartridges_cartridge_id_firearm_id', 'cartridge_id', 'firearm_id'),
 )
 
 firearm_manufacturers = Table('firearm_manufacturers', Base.metadata,
     Column('firearm_id', Integer, ForeignKey('firearms.firearm_id'), primary_key=True),
-    Column('manufacturer_id', Integer, ForeignKey('manufacturers.manufacturer_id'), primary_key=True)
+    Column('manufacturer_id', Integer, ForeignKey('manufacturers.manufacturer_id'), primary_key=True),
+    Index('ix_firearm_manufacturers_manufacturer_id_firearm_id', 'manufacturer_id', 'firearm_id'),
 )
 
 firearm_variants = Table('firearm_variants', Base.metadata,
     Column('firearm_id', Integer, ForeignKey('firearms.firearm_id'), primary_key=True),
-    Column('variant_id', Integer, ForeignKey('variants.variant_id'), primary_key=True)
+    Column('variant_id', Integer, ForeignKey('variants.variant_id'), primary_key=True),
+    Index('ix_firearm_variants_variant_id_firearm_id', 'variant_id', 'firearm_id'),
 )
 
 
@@ -37,6 +64,7 @@ firearm_variants = Table('firearm_variants', Base.metadata,
 
 class Firearm(Base):
     __tablename__ = "firearms"
+    __table_args__ = (trigram_index("firearms"),)
 
     firearm_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, unique=True)
@@ -58,34 +86,57 @@ class Firearm(Base):
 
 class Type(Base):
     __tablename__ = "types"
+    __table_args__ = (trigram_index("types"),)
     type_id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), unique=True, nullable=False)
     firearms = relationship("Firearm", secondary=firearm_types, back_populates="types")
 
 class War(Base):
     __tablename__ = "wars"
+    __table_args__ = (trigram_index("wars"),)
     war_id = Column(Integer, primary_key=True, index=True)
     name = Column(Text, unique=True, nullable=False)
     firearms = relationship("Firearm", secondary=firearm_wars, back_populates="wars")
 
 class Cartridge(Base):
     __tablename__ = "cartridges"
+    __table_args__ = (trigram_index("cartridges"),)
     cartridge_id = Column(Integer, primary_key=True, index=True)
     name = Column(Text, unique=True, nullable=False)
     firearms = relationship("Firearm", secondary=firearm_cartridges, back_populates="cartridges")
 
 class Manufacturer(Base):
     __tablename__ = "manufacturers"
+    __table_args__ = (trigram_index("manufacturers"),)
     manufacturer_id = Column(Integer, primary_key=True, index=True)
     name = Column(Text, unique=True, nullable=False)
     firearms = relationship("Firearm", secondary=firearm_manufacturers, back_populates="manufacturers")
 
 class Variant(Base):
     __tablename__ = "variants"
+    __table_args__ = (trigram_index("variants"),)
     variant_id = Column(Integer, primary_key=True, index=True)
     name = Column(Text, unique=True, nullable=False)
     firearms = relationship("Firearm", secondary=firearm_variants, back_populates="variants")
 
+class FirearmDocument(Base):
+    """A firearm with all its relationships, pre-rendered for the detail and batch endpoints (see app/documents.py)."""
+    __tablename__ = "firearm_documents"
+    firearm_id = Column(Integer, ForeignKey("firearms.firearm_id", ondelete="CASCADE"), primary_key=True)
+    document = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+
+class CatalogVersion(Base):
+    """Single-row counter bumped by every admin write (see app/versioning.py)."""
+    __tablename__ = "catalog_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class TokenRevocation(Base):
+    """Single-row counter bumped by every token revocation (see app/revocation.py)."""
+    __tablename__ = "token_revocation"
+    id = Column(Integer, primary_key=True)
+    epoch = Column(Integer, nullable=False, default=0)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -93,4 +144,6 @@ class User(Base):
     email = Column(String(255), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
     is_admin = Column(Boolean, default=False)
+    # Part of every access token; bumping it revokes the user's tokens (app/auth.py)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
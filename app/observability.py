@@ -0,0 +1,212 @@
+import contextvars
+import threading
+import time
+from typing import Optional
+
+import orjson
+from sqlalchemy import event
+
+from app.config import settings
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    """What one request spent where. Filled in by the engine and pool hooks and by `render`."""
+
+    __slots__ = ("started", "statements", "db_seconds", "pool_wait_seconds", "serialize_seconds", "response_bytes")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.response_bytes = 0
+
+    def server_timing(self) -> str:
+        """The `Server-Timing` header value, durations in milliseconds."""
+        total = time.perf_counter() - self.started
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} statements", '
+            f"pool;dur={self.pool_wait_seconds * 1000:.2f}, "
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}"
+        )
+
+
+# The timings of the request being handled. Set by `TimingMiddleware`; the
+# SQLAlchemy hooks run in the request's context (also inside the async
+# engine's greenlets), so they add to the right request.
+current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def record_pool_wait(seconds: float):
+    timings = current.get()
+    if timings is not None:
+        timings.pool_wait_seconds += seconds
+
+
+def record_serialization(seconds: float):
+    timings = current.get()
+    if timings is not None:
+        timings.serialize_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    timings = current.get()
+    if timings is not None and started is not None:
+        timings.statements += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+def attach(engine):
+    """Count statements and time spent in the database on `engine` for the current request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class RouteStats:
+    """Totals per (method, route template, status), exposed by `GET /metrics`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, method: str, route: str, status: int, duration: float, timings: RequestTimings):
+        with self._lock:
+            stats = self._routes.get((method, route, status))
+            if stats is None:
+                stats = self._routes[(method, route, status)] = {
+                    "requests": 0, "duration_seconds": 0.0, "buckets": [0] * len(DURATION_BUCKETS),
+                    "statements": 0, "db_seconds": 0.0, "pool_wait_seconds": 0.0,
+                    "serialize_seconds": 0.0, "response_bytes": 0,
+                }
+            stats["requests"] += 1
+            stats["duration_seconds"] += duration
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    stats["buckets"][i] += 1
+            stats["statements"] += timings.statements
+            stats["db_seconds"] += timings.db_seconds
+            stats["pool_wait_seconds"] += timings.pool_wait_seconds
+            stats["serialize_seconds"] += timings.serialize_seconds
+            stats["response_bytes"] += timings.response_bytes
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def prometheus(self) -> str:
+        """The totals in the Prometheus text exposition format."""
+        counters = (
+            ("statements", "firearmdb_db_statements_total", "SQL statements executed"),
+            ("db_seconds", "firearmdb_db_seconds_total", "Time spent executing SQL"),
+            ("pool_wait_seconds", "firearmdb_pool_wait_seconds_total", "Time spent waiting for a pooled connection"),
+            ("serialize_seconds", "firearmdb_serialize_seconds_total", "Time spent rendering JSON responses"),
+            ("response_bytes", "firearmdb_response_bytes_total", "Response body bytes sent"),
+        )
+        with self._lock:
+            routes = sorted((key, dict(stats, buckets=list(stats["buckets"]))) for key, stats in self._routes.items())
+        lines = [
+            "# HELP firearmdb_request_duration_seconds Request duration",
+            "# TYPE firearmdb_request_duration_seconds histogram",
+        ]
+        for (method, route, status), stats in routes:
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            for bound, count in zip(DURATION_BUCKETS, stats["buckets"]):
+                lines.append(f'firearmdb_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'firearmdb_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats["requests"]}')
+            lines.append(f"firearmdb_request_duration_seconds_sum{{{labels}}} {stats['duration_seconds']}")
+            lines.append(f"firearmdb_request_duration_seconds_count{{{labels}}} {stats['requests']}")
+        for field, name, help_text in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (method, route, status), stats in routes:
+                lines.append(f'{name}{{method="{method}",route="{route}",status="{status}"}} {stats[field]}')
+        return "\n".join(lines) + "\n"
+
+
+route_stats = RouteStats()
+
+# Set by the Lambda `handler`: CloudWatch picks metrics out of stdout lines in
+# the Embedded Metric Format, so no agent or API call is needed there.
+emit_emf = False
+
+
+def emf_line(method: str, route: str, status: int, duration: float, timings: RequestTimings) -> str:
+    return orjson.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": settings.METRICS_NAMESPACE,
+                "Dimensions": [["Route"]],
+                "Metrics": [
+                    {"Name": "Duration", "Unit": "Milliseconds"},
+                    {"Name": "DBTime", "Unit": "Milliseconds"},
+                    {"Name": "Statements", "Unit": "Count"},
+                    {"Name": "PoolWait", "Unit": "Milliseconds"},
+                    {"Name": "SerializeTime", "Unit": "Milliseconds"},
+                    {"Name": "ResponseBytes", "Unit": "Bytes"},
+                ],
+            }],
+        },
+        "Route": f"{method} {route}",
+        "Status": status,
+        "Duration": duration * 1000,
+        "DBTime": timings.db_seconds * 1000,
+        "Statements": timings.statements,
+        "PoolWait": timings.pool_wait_seconds * 1000,
+        "SerializeTime": timings.serialize_seconds * 1000,
+        "ResponseBytes": timings.response_bytes,
+    }).decode()
+
+
+class TimingMiddleware:
+    """
+    Measure every request: adds `Server-Timing` (database, pool wait,
+    serialization, total) to the response, and afterwards records the request
+    in `route_stats` and, under Lambda, as an EMF log line.
+
+    The header goes out with the response start, so for streamed bodies it
+    covers the work done before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timings.server_timing().encode())]
+            elif message["type"] == "http.response.body":
+                timings.response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current.reset(token)
+            duration = time.perf_counter() - timings.started
+            # Label by route template, so ids don't make a series each
+            route = scope.get("route")
+            route = getattr(route, "path_format", None) or "unmatched"
+            route_stats.record(scope["method"], route, status, duration, timings)
+            if emit_emf:
+                print(emf_line(scope["method"], route, status, duration, timings), flush=True)
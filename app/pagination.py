@@ -0,0 +1,169 @@
+import base64
+import binascii
+import bisect
+import json
+from typing import Any, NamedTuple, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+from app import counting
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class SortKey(NamedTuple):
+    """A column or labelled expression a page is ordered by."""
+    column: Any
+    descending: bool = False
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode the sort-key values of the last row of a page into an opaque cursor."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _matches(value, expected: type) -> bool:
+    if isinstance(value, bool):
+        return False
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def decode_cursor(cursor: str, size: int, types: Optional[Sequence[type]] = None) -> list:
+    """
+    Decode a cursor produced by `encode_cursor`, rejecting anything malformed
+    with a 400. `types` are the Python types of the sort keys; by default
+    every key is an integer id.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not all(_matches(value, expected) for value, expected in zip(values, types or [int] * size)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def clamp_limit(limit: int) -> int:
+    """`limit` within 1..MAX_LIMIT."""
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _python_type(column) -> type:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return object
+
+
+def _after(keys, values):
+    columns = [key.column for key in keys]
+    if not any(key.descending for key in keys):
+        if len(keys) == 1:
+            return columns[0] > values[0]
+        return tuple_(*columns) > tuple_(*values)
+
+    # Mixed directions can't use a row comparison, so spell out the
+    # lexicographic "comes after" condition key by key.
+    clauses = []
+    for i, key in enumerate(keys):
+        step = key.column < values[i] if key.descending else key.column > values[i]
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], step))
+    return or_(*clauses)
+
+
+async def paginate(
+    db,
+    stmt,
+    keys,
+    offset: int = 0,
+    limit: int = DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+) -> dict:
+    """
+    Run the select `stmt` as one page of a `PaginatedResponse`.
+
+    `keys` are the columns (or `SortKey`s) the page is ordered by; together
+    they must be unique (end them with the primary key). Without a cursor the
+    page is selected with OFFSET as before. With a cursor the page starts right
+    after the row the cursor was taken from, so deep pages cost the same as the
+    first one.
+
+    One extra row is fetched to work out `has_more`, so the total is only
+    counted when `include_total` is set (see `counting.count_rows`).
+    """
+    limit = clamp_limit(limit)
+    if offset < 0:
+        offset = 0
+
+    keys = [key if isinstance(key, SortKey) else SortKey(key) for key in keys]
+    total, estimated = await counting.count_rows(db, stmt) if include_total else (None, False)
+    page = stmt.add_columns(*[key.column for key in keys]).order_by(
+        *[key.column.desc() if key.descending else key.column for key in keys]
+    )
+
+    if cursor is None:
+        page = page.offset(offset)
+    else:
+        values = decode_cursor(cursor, len(keys), [_python_type(key.column) for key in keys])
+        page = page.where(_after(keys, values))
+        offset = None
+
+    rows = (await db.execute(page.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "items": [row[0] for row in rows],
+        "total": total,
+        "total_estimated": estimated,
+        "offset": offset,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1][1:]) if has_more and rows else None,
+    }
+
+
+def paginate_rows(
+    rows: Sequence,
+    key: str,
+    offset: int = 0,
+    limit: int = DEFAULT_LIMIT,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+) -> dict:
+    """
+    Same contract as `paginate`, for rows already in memory and sorted by the
+    unique attribute `key` (see `cache.lookup_table`). Cursors are
+    interchangeable with the ones `paginate` issues for a primary-key order.
+    """
+    limit = clamp_limit(limit)
+    if offset < 0:
+        offset = 0
+
+    if cursor is not None:
+        (last,) = decode_cursor(cursor, 1)
+        offset = None
+        start = bisect.bisect_right(rows, last, key=lambda row: getattr(row, key))
+    else:
+        start = offset
+
+    page = rows[start:start + limit]
+    has_more = start + limit < len(rows)
+    return {
+        "items": list(page),
+        "total": len(rows) if include_total else None,
+        "total_estimated": False,
+        "offset": offset,
+        "limit": limit,
+        "has_more": has_more,
+        "next_cursor": encode_cursor([getattr(page[-1], key)]) if has_more and page else None,
+    }
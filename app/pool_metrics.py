@@ -0,0 +1,83 @@
+import threading
+import time
+
+from sqlalchemy import event
+
+from app import observability
+
+
+class PoolStats:
+    """Process-wide gauges for the connection pool: checkout wait and connections in use."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.in_use = 0
+            self.max_in_use = 0
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        observability.record_pool_wait(seconds)
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def checked_out(self):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+
+pool_stats = PoolStats()
+_timed_classes = {}
+
+
+def timed(pool_class):
+    """
+    Subclass `pool_class` so the time spent getting a connection from it
+    (queueing for a free slot, or connecting for pools that don't keep any)
+    is recorded in `pool_stats`.
+    """
+    if pool_class not in _timed_classes:
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                connection = pool_class._do_get(self)
+            except Exception:
+                pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+                raise
+            pool_stats.record_wait(time.perf_counter() - start)
+            return connection
+
+        _timed_classes[pool_class] = type(f"Timed{pool_class.__name__}", (pool_class,), {"_do_get": _do_get})
+    return _timed_classes[pool_class]
+
+
+def attach(engine):
+    """Track connections in use on `engine`."""
+    event.listen(engine, "checkout", lambda *args: pool_stats.checked_out())
+    event.listen(engine, "checkin", lambda *args: pool_stats.checked_in())
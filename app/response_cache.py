@@ -0,0 +1,234 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from fastapi.concurrency import run_in_threadpool
+
+from app import versioning
+from app.config import settings
+from app.database import new_session, shared_session
+
+logger = logging.getLogger(__name__)
+
+# Only API routes set `Cache-Control: public`; `/`, `/metrics` and the docs
+# never need the catalog version (or the database)
+CACHEABLE_PREFIX = "/api/v1/"
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+
+def normalize(path: str, query_string: bytes) -> str:
+    """`path?query` with the parameters sorted by name, so `?b=1&a=2` and `?a=2&b=1` share an entry."""
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    query = urlencode(sorted(params, key=lambda param: param[0]))
+    return f"{path}?{query}" if query else path
+
+
+class ResponseCache:
+    """
+    Final response bytes by normalized URL, bounded by total size with LRU
+    eviction. With `spill_dir` every entry is also written there, so a new
+    handler in the same container (e.g. after an import error or a runtime
+    restart) starts with the previous one's responses.
+    """
+
+    def __init__(self, max_bytes: int, spill_dir: str = ""):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    def _read_spilled(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(key), "rb") as f:
+                meta, body = f.read().split(b"\n", 1)
+        except (OSError, ValueError):
+            return None
+        meta = orjson.loads(meta)
+        if meta["key"] != key:
+            return None
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in meta["headers"]]
+        return CachedResponse(meta["version"], meta["status"], headers, body)
+
+    def _spill(self, key: str, entry: CachedResponse):
+        meta = orjson.dumps({
+            "key": key,
+            "version": entry.version,
+            "status": entry.status,
+            "headers": [(name.decode("latin-1"), value.decode("latin-1")) for name, value in entry.headers],
+        })
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(meta + b"\n" + entry.body)
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning("Could not spill a cached response to %s: %s", self.spill_dir, exc)
+
+    async def get(self, key: str, version: int) -> Optional[CachedResponse]:
+        """The entry for `key` if it was stored at catalog `version`, else None. Spill files are read in a worker thread."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.spill_dir:
+            entry = await run_in_threadpool(self._read_spilled, key)
+            if entry is not None and entry.version == version:
+                self._store(key, entry)
+        with self._lock:
+            if entry is not None and entry.version == version:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def _store(self, key: str, entry: CachedResponse):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    async def put(self, key: str, entry: CachedResponse):
+        """Keep `entry` in memory, and write it to the spill directory in a worker thread."""
+        if entry.size > min(self.max_bytes, settings.RESPONSE_CACHE_MAX_ENTRY_BYTES):
+            return
+        self._store(key, entry)
+        if self.spill_dir:
+            await run_in_threadpool(self._spill, key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+        if self.spill_dir and os.path.isdir(self.spill_dir):
+            for name in os.listdir(self.spill_dir):
+                try:
+                    os.remove(os.path.join(self.spill_dir, name))
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_SPILL_DIR)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags or "*" in tags
+
+
+class ResponseCacheMiddleware:
+    """
+    Serve anonymous GETs from `response_cache`, skipping routing, the
+    database and serialization.
+
+    Only complete 200 responses marked `Cache-Control: public` (see
+    `conditional_get`) are stored. Entries are tagged with the catalog
+    version: admin writes clear this container's cache at once (via
+    `cache.invalidate_catalog`) and other containers' entries stop matching
+    within `VERSION_CHECK_TTL`. Requests with `Authorization` always go to
+    the app.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not settings.RESPONSE_CACHE_ENABLED
+            or not scope["path"].startswith(CACHEABLE_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers", []))
+        if b"authorization" in headers:
+            await self.app(scope, receive, send)
+            return
+
+        key = normalize(scope["path"], scope.get("query_string", b""))
+        shared = shared_session.get()
+        if shared is not None:
+            # A POST /batch sub-request: stay on the batch's connection
+            version = await versioning.current(shared)
+        else:
+            async with new_session() as db:
+                version = await versioning.current(db)
+        entry = await response_cache.get(key, version)
+        if entry is not None:
+            if_none_match = headers.get(b"if-none-match")
+            etag = dict(entry.headers).get(b"etag")
+            if if_none_match and etag and _etag_matches(if_none_match.decode("latin-1"), etag.decode("latin-1")):
+                not_modified = [(name, value) for name, value in entry.headers if name in (b"etag", b"cache-control")]
+                await send({"type": "http.response.start", "status": 304, "headers": not_modified})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers + [(b"x-cache", b"hit")]})
+            await send({"type": "http.response.body", "body": entry.body})
+            return
+
+        start = None
+        chunks = []
+        cacheable = True
+        complete = None
+
+        async def send_and_capture(message):
+            nonlocal start, cacheable, complete
+            if message["type"] == "http.response.start":
+                start = message
+                cache_control = dict(message.get("headers", [])).get(b"cache-control", b"")
+                cacheable = message["status"] == 200 and cache_control.startswith(b"public")
+            elif message["type"] == "http.response.body" and cacheable:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    complete = CachedResponse(version, start["status"], list(start.get("headers", [])), b"".join(chunks))
+                elif sum(len(chunk) for chunk in chunks) > settings.RESPONSE_CACHE_MAX_ENTRY_BYTES:
+                    # Too big (e.g. an export); stop collecting
+                    cacheable = False
+                    chunks.clear()
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+        if complete is not None:
+            # After the response went out, so spilling never delays it
+            await response_cache.put(key, complete)
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from sqlalchemy import select, update
+
+from app import models
+from app.config import settings
+
+_lock = threading.Lock()
+_cached = None
+
+
+async def current(db) -> int:
+    """
+    The token revocation epoch, bumped by every revocation in any container.
+    Re-read from the database at most once every `REVOCATION_CHECK_TTL`
+    seconds, so most requests never query it.
+    """
+    global _cached
+    now = time.monotonic()
+    with _lock:
+        if _cached is not None and _cached[0] > now:
+            return _cached[1]
+
+    epoch = (await db.execute(
+        select(models.TokenRevocation.epoch).where(models.TokenRevocation.id == 1)
+    )).scalar()
+    epoch = epoch or 0
+    with _lock:
+        _cached = (now + settings.REVOCATION_CHECK_TTL, epoch)
+    return epoch
+
+
+async def bump(db):
+    """Increment the revocation epoch inside the caller's transaction."""
+    result = await db.execute(
+        update(models.TokenRevocation)
+        .where(models.TokenRevocation.id == 1)
+        .values(epoch=models.TokenRevocation.epoch + 1)
+    )
+    if result.rowcount == 0:
+        db.add(models.TokenRevocation(id=1, epoch=1))
+
+
+def forget():
+    """Make the next `current` call re-read the epoch."""
+    global _cached
+    with _lock:
+        _cached = None
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, auth, cache, compression, pool_metrics, response_cache
+from app.database import get_db
+from app.config import settings
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+@router.get("/cache")
+async def get_cache_stats(current_user: models.User = Depends(auth.get_current_admin_user)):
+    """
+    Hit/miss counters of the process-local caches. Requires Admin privileges.
+    """
+    return {
+        "lookup": cache.lookup_cache.stats(),
+        "principal": auth.principal_cache.stats(),
+        "compressed": compression.compressed_cache.stats(),
+        "responses": response_cache.response_cache.stats(),
+    }
+
+@router.get("/pool")
+async def get_pool_stats(current_user: models.User = Depends(auth.get_current_admin_user)):
+    """
+    Connection pool mode and gauges (checkout wait, connections in use). Requires Admin privileges.
+    """
+    return {"mode": settings.DB_POOL_MODE, **pool_metrics.pool_stats.snapshot()}
+
+@router.post("/users/{user_id}/revoke-tokens", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_user_tokens(user_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
+    """
+    Invalidate every access token issued to a user; they have to log in again. Requires Admin privileges.
+    """
+    if not await auth.revoke_tokens(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
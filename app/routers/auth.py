@@ -1,38 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import schemas, models, auth
 from app.database import get_db
 router = APIRouter(tags=["Authentication"])
 
 @router.post("/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = (await db.execute(select(models.User).where(models.User.email == user.email))).scalar_one_or_none()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = auth.get_password_hash(user.password)
+    # bcrypt is deliberately slow; keep it off the event loop
+    hashed_password = await run_in_threadpool(auth.get_password_hash, user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = (await db.execute(select(models.User).where(models.User.email == form_data.username))).scalar_one_or_none()
+    if not user or not await run_in_threadpool(auth.verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token = auth.create_access_token(
-        data={"sub": user.email}
+        data=auth.user_claims(user)
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.User)
-async def get_current_user_info(current_user: models.User = Depends(auth.get_current_user)):
+async def get_current_user_info(current_user: auth.Principal = Depends(auth.get_current_user)):
     """Returns the current authenticated user's information including role."""
     return current_user
\ No newline at end of file
@@ -1,109 +1,63 @@
-from fastapi import APIRouter, Request
-from app import schemas, models
-from typing import List
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter
+from app import schemas, models, batch, search, cache
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from app.conditional import conditional_get
+from app.serialization import render
+from app.pagination import paginate, paginate_rows
 from fastapi import Depends, HTTPException
-router = APIRouter(prefix="/cartridge", tags=["Cartridge"])
+router = APIRouter(prefix="/cartridge", tags=["Cartridge"], dependencies=[Depends(conditional_get)])
 
-@router.get("/")
-def get_cartridges(
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.Cartridge])
+async def get_cartridges(
     offset: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all cartridges with pagination. Default limit=50, max limit=200."""
-    if limit > 200:
-        limit = 200
-    if offset < 0:
-        offset = 0
-    
-    total = db.query(models.Cartridge).count()
-    items = db.query(models.Cartridge).offset(offset).limit(limit).all()
-    
-    return {
-        "items": items,
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "has_more": offset + limit < total
-    }
-
-@router.get("/search")
-def search_cartridges(
+    page = paginate_rows(
+        (await cache.lookup_table(db, models.Cartridge)).rows, "cartridge_id",
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    return render(schemas.PaginatedResponse[schemas.Cartridge], page)
+
+@router.get("/search", response_model=schemas.PaginatedResponse[schemas.Cartridge])
+async def search_cartridges(
     name: str,
     offset: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Search for cartridges by name with pagination."""
+    """Search for cartridges by name with pagination, ranked by relevance."""
     if not name:
         raise HTTPException(status_code=400, detail="Name query parameter is required")
-    if limit > 200:
-        limit = 200
-    if offset < 0:
-        offset = 0
     
-    query = db.query(models.Cartridge).filter(models.Cartridge.name.ilike(f"%{name}%"))
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
+    query, keys = await search.by_name(db, models.Cartridge, name)
+    page = await paginate(
+        db, query, keys,
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
     
-    if total == 0:
+    if not page["items"] and page["offset"] == 0:
         raise HTTPException(status_code=404, detail="No cartridges found matching the search criteria")
     
-    return {
-        "items": items,
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "has_more": offset + limit < total
-    }
+    return render(schemas.PaginatedResponse[schemas.Cartridge], page)
+
+@router.get("/batch", response_model=schemas.BatchResponse[schemas.Cartridge])
+async def get_cartridges_batch(ids: str, db: AsyncSession = Depends(get_db)):
+    """Get several cartridges by ID (`ids=1,2,3`), in the order asked for; unknown IDs are listed in `missing`."""
+    ids = batch.parse_ids(ids)
+    table = await cache.lookup_table(db, models.Cartridge)
+    return render(schemas.BatchResponse[schemas.Cartridge], batch.in_request_order(ids, table.by_id))
 
 @router.get("/{cartridge_id}", response_model=schemas.Cartridge)
-def get_cartridge(cartridge_id: int, db: Session = Depends(get_db)):
-    cartridge = db.query(models.Cartridge).filter(models.Cartridge.cartridge_id == cartridge_id).first()
+async def get_cartridge(cartridge_id: int, db: AsyncSession = Depends(get_db)):
+    cartridge = (await cache.lookup_table(db, models.Cartridge)).by_id.get(cartridge_id)
     if not cartridge:
         raise HTTPException(status_code=404, detail="Cartridge not found")
     return cartridge
-
-
-@router.get("/{cartridge_id}/firearms", response_model=List[schemas.Firearm])
-def get_firearms_for_cartridge(cartridge_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of all firearms that are chambered for a specific cartridge.
-    """
-    
-    db_cartridge = db.query(models.Cartridge).options(
-        joinedload(models.Cartridge.firearms)
-    ).filter(models.Cartridge.cartridge_id == cartridge_id).first()
-
-    if db_cartridge is None:
-        raise HTTPException(status_code=404, detail="Cartridge not found")
-    
-    return db_cartridge.firearms
-
-@router.get("/{cartridge_id}/firearms/names", response_model=List[schemas.NameWithCartridge])
-def get_firearm_names_for_cartridge(request: Request, cartridge_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of firearm IDs and names that are chambered for a specific cartridge.
-    """
-    db_cartridge = db.query(models.Cartridge).options(
-        joinedload(models.Cartridge.firearms)
-    ).filter(models.Cartridge.cartridge_id == cartridge_id).first()
-
-    if db_cartridge is None:
-        raise HTTPException(status_code=404, detail="Cartridge not found")
-    
-    return [
-        schemas.NameWithManufacturer(
-            firearm_id=firearm.firearm_id, 
-            name=firearm.name,
-            manufacturer=firearm.manufacturer.name if firearm.manufacturer else None
-        ) 
-        for firearm in db_cartridge.firearms
-    ]
-
-
-
-
-
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import composite, schemas
+from app.database import get_db
+
+router = APIRouter(tags=["Batch"])
+
+@router.post("/batch", response_model=schemas.CompositeResponse)
+async def batch_requests(body: schemas.CompositeRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Run several GETs in one call, e.g. a firearm with its wars and cartridges.
+
+    Sub-requests run concurrently on one database session and go through the
+    same caching, rate limits and auth (the batch's `Authorization` is passed
+    on) as separate calls would. Each comes back with its own `status`,
+    `headers` and `body`, in request order; a failing one doesn't fail the
+    batch. At most `COMPOSITE_MAX_REQUESTS` sub-requests and
+    `COMPOSITE_MAX_COST` total cost (searches cost `COMPOSITE_SEARCH_COST`).
+    """
+    composite.check(body.requests)
+    content = await composite.run(request.app, request.scope, body.requests, db)
+    return Response(content=content, media_type="application/json")
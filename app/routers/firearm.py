@@ -1,138 +1,250 @@
-from fastapi import APIRouter, Request, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from app import schemas, models, auth
+from fastapi import APIRouter, Request, Response, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+import orjson
+from app import schemas, models, auth, batch, bulk_import, cache, documents, export, facets, includes, search, snapshot, versioning
 from app.database import get_db
-from typing import List
+from app.conditional import conditional_get
+from app.serialization import render
+from app.pagination import paginate
+from typing import Literal, Optional
 
-router = APIRouter(prefix="/firearm", tags=["Firearm"])
+router = APIRouter(prefix="/firearm", tags=["Firearm"], dependencies=[Depends(conditional_get)])
 
-@router.get("/")
-def get_firearms(
+# What schemas.Firearm serializes, for the admin write responses
+FIREARM_LOAD = (selectinload(models.Firearm.wars), selectinload(models.Firearm.cartridges))
+
+async def _get_firearm(db: AsyncSession, firearm_id: int):
+    return (await db.execute(
+        select(models.Firearm).options(*FIREARM_LOAD).where(models.Firearm.firearm_id == firearm_id)
+    )).scalar_one_or_none()
+
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.FirearmExpanded])
+async def get_firearms(
     offset: int = 0, 
     limit: int = 50, 
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all firearms with pagination. Default limit=50, max limit=200."""
-    if limit > 200:
-        limit = 200
-    if offset < 0:
-        offset = 0
-    
-    total = db.query(models.Firearm).count()
-    items = db.query(models.Firearm).offset(offset).limit(limit).all()
-    
-    return {
-        "items": items,
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "has_more": offset + limit < total
-    }
-
-@router.get("/search")
-def search_firearms(
+    """
+    Get all firearms with pagination. Default limit=50, max limit=200. Pass `next_cursor` as `cursor` for keyset paging.
+
+    `include` picks the relationships to embed: any of types, wars, cartridges,
+    manufacturers and variants (default wars,cartridges). `fields` limits the
+    response, and the columns read from the database, to the listed fields.
+    """
+    plan = includes.plan(include, fields)
+    snap = await snapshot.active(db)
+    if snap is not None:
+        page = snap.firearm_page(plan, offset=offset, limit=limit, cursor=cursor, include_total=include_total)
+        return render(schemas.PaginatedResponse[plan.schema], page)
+    page = await paginate(
+        db, select(models.Firearm).options(*plan.options()),
+        [models.Firearm.firearm_id],
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    page["items"] = plan.expand_all(page["items"])
+    return render(schemas.PaginatedResponse[plan.schema], page)
+
+@router.get("/search", response_model=schemas.PaginatedResponse[schemas.FirearmExpanded])
+async def search_firearms(
     name: str, 
     offset: int = 0, 
     limit: int = 50, 
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Search for firearms by name with pagination."""
+    """Search for firearms by name with pagination, ranked by relevance."""
     if not name:
         raise HTTPException(status_code=400, detail="Name query parameter is required")
-    if limit > 200:
-        limit = 200
-    if offset < 0:
-        offset = 0
+    plan = includes.plan(include, fields)
     
-    query = db.query(models.Firearm).filter(models.Firearm.name.ilike(f"%{name}%"))
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
+    query, keys = await search.by_name(db, models.Firearm, name)
+    page = await paginate(
+        db, query.options(*plan.options()), keys,
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
     
-    if total == 0:
+    if not page["items"] and page["offset"] == 0:
         raise HTTPException(status_code=404, detail="No firearms found matching the search criteria")
     
-    return {
-        "items": items,
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "has_more": offset + limit < total
-    }
+    page["items"] = plan.expand_all(page["items"])
+    return render(schemas.PaginatedResponse[plan.schema], page)
 
-@router.get("/{firearm_id}", response_model=schemas.Firearm)
-def get_firearm(firearm_id: int, request: Request, db: Session = Depends(get_db)):
-    """
-    Get a specific firearm by its ID.
+@router.get("/batch", response_model=schemas.BatchResponse[schemas.FirearmExpanded])
+async def get_firearms_batch(ids: str, include: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     """
-    db_firearm = db.query(models.Firearm).filter(models.Firearm.firearm_id == firearm_id).first()
-    if db_firearm is None:
-        raise HTTPException(status_code=404, detail="Firearm not found")
-    return db_firearm
-
+    Get several firearms by ID, e.g. `ids=1,2,3&include=wars,cartridges,types`.
 
+    Without `include` each firearm is its full document, with every
+    relationship. Otherwise `include` picks any of types, wars, cartridges,
+    manufacturers and variants. Firearms come back in the order asked for;
+    unknown IDs are listed in `missing` instead of failing the request.
+    """
+    ids = batch.parse_ids(ids)
+    plan = includes.plan(include or includes.FULL_INCLUDE)
+    snap = await snapshot.active(db)
+    if snap is not None:
+        return render(schemas.BatchResponse[plan.schema], batch.in_request_order(ids, snap.firearms_by_id(ids, plan)))
+    if include is None:
+        found = batch.in_request_order(ids, await documents.read(db, ids))
+        body = b'{"items":[' + b",".join(found["items"]) + b'],"missing":' + orjson.dumps(found["missing"]) + b"}"
+        return Response(content=body, media_type="application/json")
+    return render(schemas.BatchResponse[plan.schema], await batch.firearms(db, ids, plan))
 
-@router.get("/{firearm_id}/wars", response_model=List[schemas.War])
-def get_wars_for_firearm(firearm_id: int, request: Request, db: Session = Depends(get_db)):
+@router.get("/filter", response_model=schemas.FacetedResponse[schemas.FirearmExpanded])
+async def filter_firearms(
+    type_id: Optional[str] = None,
+    war_id: Optional[str] = None,
+    cartridge_id: Optional[str] = None,
+    manufacturer_id: Optional[str] = None,
+    variant_id: Optional[str] = None,
+    facet: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Get a list of all wars a specific firearm was used in.
+    Filter firearms by type, war, cartridge, manufacturer and variant IDs, e.g.
+    `type_id=3&cartridge_id=12&war_id=2`.
+
+    Each filter takes comma-separated IDs, any of which may match; filters
+    are combined with AND. `facets` lists, for each of the facets named in
+    `facet` (default all), how many matching firearms link to each value.
     """
-    db_firearm = db.query(models.Firearm).options(
-        joinedload(models.Firearm.wars)
-    ).filter(models.Firearm.firearm_id == firearm_id).first()
+    plan = includes.plan(include, fields)
+    params = {"types": type_id, "wars": war_id, "cartridges": cartridge_id, "manufacturers": manufacturer_id, "variants": variant_id}
+    filters = {name: batch.parse_ids(value) for name, value in params.items() if value}
+    facet_names = list(params) if facet is None else [name for name in facet.split(",") if name]
+    unknown = [name for name in facet_names if name not in params]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown facet {', '.join(unknown)}; expected any of {', '.join(params)}")
 
-    if db_firearm is None:
-        raise HTTPException(status_code=404, detail="Firearm not found")
-    
-    return db_firearm.wars
+    snap = await snapshot.active(db)
+    if snap is not None:
+        page = snap.filter(filters, facet_names, plan, offset=offset, limit=limit, cursor=cursor)
+        return render(schemas.FacetedResponse[plan.schema], page)
+    page = await facets.filter_firearms(db, filters, facet_names, offset=offset, limit=limit, cursor=cursor)
+    page["items"] = await facets.load_page(db, page["items"], plan)
+    return render(schemas.FacetedResponse[plan.schema], page)
 
-@router.get("/{firearm_id}/cartridges", response_model=List[schemas.Cartridge])
-def get_cartridges_for_firearm(firearm_id: int, request: Request, db: Session = Depends(get_db)):
-    """
-    Get a list of all cartridges a specific firearm is chambered for.
-    """
-    db_firearm = db.query(models.Firearm).options(
-        joinedload(models.Firearm.cartridges)
-    ).filter(models.Firearm.firearm_id == firearm_id).first()
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
-    if db_firearm is None:
-        raise HTTPException(status_code=404, detail="Firearm not found")
-    
-    return db_firearm.cartridges
+@router.get("/export", response_class=StreamingResponse)
+async def export_firearms(format: Literal["ndjson", "csv"] = "ndjson", gzip: bool = False):
+    """
+    Stream every firearm with its related names as NDJSON or CSV.
 
-@router.get("/{firearm_id}/manufacturers", response_model=List[schemas.Manufacturer])
-def get_manufacturers_for_firearm(firearm_id: int, request: Request, db: Session = Depends(get_db)):
+    Records use the bulk import's fields, so the output can be posted back to
+    `/firearm/bulk`. With `gzip=true` the body is compressed on the fly and
+    sent with `Content-Encoding: gzip`.
     """
-    Get a list of all manufacturers for a specific firearm.
+    headers = {"Content-Disposition": f'attachment; filename="firearms.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export.export_firearms(format, compress=gzip),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+@router.get("/{firearm_id}", response_model=schemas.FirearmExpanded)
+async def get_firearm(
+    firearm_id: int,
+    request: Request,
+    include: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    db_firearm = db.query(models.Firearm).options(
-        joinedload(models.Firearm.manufacturers)
-    ).filter(models.Firearm.firearm_id == firearm_id).first()
+    Get a specific firearm by its ID.
 
+    By default this is the firearm's full document, with every relationship,
+    read from `firearm_documents` in one primary-key lookup. `include` and
+    `fields` narrow it as on `/firearm/`.
+    """
+    full = include is None and fields is None
+    plan = includes.plan(includes.FULL_INCLUDE if full else include, fields)
+    snap = await snapshot.active(db)
+    if snap is not None:
+        db_firearm = snap.firearm(firearm_id, plan)
+        if db_firearm is None:
+            raise HTTPException(status_code=404, detail="Firearm not found")
+        return render(plan.schema, db_firearm)
+    if full:
+        document = (await documents.read(db, [firearm_id])).get(firearm_id)
+        if document is None:
+            raise HTTPException(status_code=404, detail="Firearm not found")
+        return Response(content=document, media_type="application/json")
+    db_firearm = (await db.execute(
+        select(models.Firearm).options(*plan.options()).where(models.Firearm.firearm_id == firearm_id)
+    )).scalar_one_or_none()
     if db_firearm is None:
         raise HTTPException(status_code=404, detail="Firearm not found")
-    
+    return render(plan.schema, plan.expand(db_firearm))
+
+
 
 @router.post("/", response_model=schemas.Firearm, status_code=status.HTTP_201_CREATED)
-def create_firearm(firearm: schemas.FirearmCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
+async def create_firearm(firearm: schemas.FirearmCreate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
     """
     Create a new firearm. Requires Admin privileges.
     """
-    db_firearm = db.query(models.Firearm).filter(models.Firearm.name == firearm.name).first()
+    db_firearm = (await db.execute(
+        select(models.Firearm).where(models.Firearm.name == firearm.name)
+    )).scalar_one_or_none()
     if db_firearm:
         raise HTTPException(status_code=400, detail="Firearm with this name already exists")
     
     new_firearm = models.Firearm(**firearm.model_dump())
     db.add(new_firearm)
-    db.commit()
-    db.refresh(new_firearm)
-    return new_firearm
+    await db.flush()
+    await documents.refresh(db, [new_firearm.firearm_id])
+    await versioning.bump(db)
+    await db.commit()
+    cache.invalidate_catalog()
+    return await _get_firearm(db, new_firearm.firearm_id)
+
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_firearms(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_admin_user),
+):
+    """
+    Import firearms from a streamed NDJSON or CSV body. Requires Admin privileges.
+
+    Each record has the firearm columns plus `types`, `wars`, `cartridges`,
+    `manufacturers` and `variants` as lists of names (in CSV, `|`-separated).
+    Firearms are upserted by name, unknown lookup names are created, and
+    per-row errors are reported at the end. The format defaults to the
+    request's Content-Type.
+    """
+    if format is None:
+        format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    try:
+        return await bulk_import.import_firearms(db, request.stream(), format)
+    finally:
+        cache.invalidate_catalog()
 
 @router.put("/{firearm_id}", response_model=schemas.Firearm)
-def update_firearm(firearm_id: int, firearm: schemas.FirearmUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
+async def update_firearm(firearm_id: int, firearm: schemas.FirearmUpdate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
     """
     Update a firearm's details. Requires Admin privileges.
     """
-    db_firearm = db.query(models.Firearm).filter(models.Firearm.firearm_id == firearm_id).first()
+    db_firearm = await _get_firearm(db, firearm_id)
     if db_firearm is None:
         raise HTTPException(status_code=404, detail="Firearm not found")
     
@@ -141,19 +253,26 @@ def update_firearm(firearm_id: int, firearm: schemas.FirearmUpdate, db: Session
     for key, value in update_data.items():
         setattr(db_firearm, key, value)
     
-    db.commit()
-    db.refresh(db_firearm)
+    await db.flush()
+    await documents.refresh(db, [firearm_id])
+    await versioning.bump(db)
+    await db.commit()
+    cache.invalidate_catalog()
     return db_firearm
 
 @router.delete("/{firearm_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_firearm(firearm_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
+async def delete_firearm(firearm_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(auth.get_current_admin_user)):
     """
     Delete a firearm. Requires Admin privileges.
     """
-    db_firearm = db.query(models.Firearm).filter(models.Firearm.firearm_id == firearm_id).first()
+    db_firearm = await db.get(models.Firearm, firearm_id)
     if db_firearm is None:
         raise HTTPException(status_code=404, detail="Firearm not found")
     
-    db.delete(db_firearm)
-    db.commit()
+    await db.delete(db_firearm)
+    await db.flush()
+    await documents.refresh(db, [firearm_id])
+    await versioning.bump(db)
+    await db.commit()
+    cache.invalidate_catalog()
     return None
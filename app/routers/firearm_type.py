@@ -1,59 +1,63 @@
-from fastapi import APIRouter, Request
-from app import schemas, models
-from typing import List
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter
+from app import schemas, models, batch, search, cache
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from app.conditional import conditional_get
+from app.serialization import render
+from app.pagination import paginate, paginate_rows
 from fastapi import Depends, HTTPException
-router = APIRouter(prefix="/type", tags=["Firearm Type"])
+router = APIRouter(prefix="/type", tags=["Firearm Type"], dependencies=[Depends(conditional_get)])
 
-@router.get("/", response_model=List[schemas.Type])
-def get_types(db: Session = Depends(get_db)):
-    return db.query(models.Type).all()
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.Type])
+async def get_types(
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get all types with pagination. Default limit=50, max limit=200."""
+    page = paginate_rows(
+        (await cache.lookup_table(db, models.Type)).rows, "type_id",
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    return render(schemas.PaginatedResponse[schemas.Type], page)
 
-@router.get("/search", response_model=List[schemas.Type])
-def search_types(name: str, db: Session = Depends(get_db)):
+@router.get("/search", response_model=schemas.PaginatedResponse[schemas.Type])
+async def search_types(
+    name: str,
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Search for types by name (case-insensitive, partial match).
+    Search for types by name (case-insensitive, partial match), ranked by relevance.
     """
     if not name:
         raise HTTPException(status_code=400, detail="Name query parameter is required")
     
-    result = db.query(models.Type).filter(models.Type.name.ilike(f"%{name}%")).all()
-    if not result:
+    query, keys = await search.by_name(db, models.Type, name)
+    page = await paginate(
+        db, query, keys,
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    if not page["items"] and page["offset"] == 0:
         raise HTTPException(status_code=404, detail="No types found matching the search criteria")
-    return result
+    return render(schemas.PaginatedResponse[schemas.Type], page)
+
+@router.get("/batch", response_model=schemas.BatchResponse[schemas.Type])
+async def get_types_batch(ids: str, db: AsyncSession = Depends(get_db)):
+    """Get several types by ID (`ids=1,2,3`), in the order asked for; unknown IDs are listed in `missing`."""
+    ids = batch.parse_ids(ids)
+    table = await cache.lookup_table(db, models.Type)
+    return render(schemas.BatchResponse[schemas.Type], batch.in_request_order(ids, table.by_id))
 
 @router.get("/{type_id}", response_model=schemas.Type)
-def get_type(type_id: int, db: Session = Depends(get_db)):
-    type_instance = db.query(models.Type).filter(models.Type.type_id == type_id).first()
+async def get_type(type_id: int, db: AsyncSession = Depends(get_db)):
+    type_instance = (await cache.lookup_table(db, models.Type)).by_id.get(type_id)
     if not type_instance:
         raise HTTPException(status_code=404, detail="Type not found")
     return type_instance
-
-@router.get("/{type_id}/firearms", response_model=List[schemas.Firearm])
-def get_firearms_for_type(request: Request, type_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of all firearms of a specific type.
-    """
-    db_type = db.query(models.Type).options(
-        joinedload(models.Type.firearms)
-    ).filter(models.Type.type_id == type_id).first()
-
-    if db_type is None:
-        raise HTTPException(status_code=404, detail="Type not found")
-    
-    return db_type.firearms
-
-@router.get("/{type_id}/firearms/names", response_model=List[schemas.NameWithType])
-def get_firearm_names_for_type(request: Request, type_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of firearm IDs and names of a specific type.
-    """
-    db_type = db.query(models.Type).options(
-        joinedload(models.Type.firearms)
-    ).filter(models.Type.type_id == type_id).first()
-
-    if db_type is None:
-        raise HTTPException(status_code=404, detail="Type not found")
-    
-    return [schemas.NameWithType(firearm_id=firearm.firearm_id, name=firearm.name) for firearm in db_type.firearms]
\ No newline at end of file
@@ -1,61 +1,64 @@
-from fastapi import APIRouter, Request
-from app import schemas, models
-from typing import List
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter
+from app import schemas, models, batch, search, cache
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from app.conditional import conditional_get
+from app.serialization import render
+from app.pagination import paginate, paginate_rows
 from fastapi import Depends, HTTPException
-router = APIRouter(prefix="/manufacturer", tags=["Manufacturer"])
+router = APIRouter(prefix="/manufacturer", tags=["Manufacturer"], dependencies=[Depends(conditional_get)])
 
 
-@router.get("/", response_model=List[schemas.Manufacturer])
-def get_manufacturers(db: Session = Depends(get_db)):
-    return db.query(models.Manufacturer).all()
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.Manufacturer])
+async def get_manufacturers(
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get all manufacturers with pagination. Default limit=50, max limit=200."""
+    page = paginate_rows(
+        (await cache.lookup_table(db, models.Manufacturer)).rows, "manufacturer_id",
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    return render(schemas.PaginatedResponse[schemas.Manufacturer], page)
 
-@router.get("/search", response_model=List[schemas.Manufacturer])
-def search_manufacturers(name: str, db: Session = Depends(get_db)):
+@router.get("/search", response_model=schemas.PaginatedResponse[schemas.Manufacturer])
+async def search_manufacturers(
+    name: str,
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Search for manufacturers by name (case-insensitive, partial match).
+    Search for manufacturers by name (case-insensitive, partial match), ranked by relevance.
     """
     if not name:
         raise HTTPException(status_code=400, detail="Name query parameter is required")
     
-    result = db.query(models.Manufacturer).filter(models.Manufacturer.name.ilike(f"%{name}%")).all()
-    if not result:
+    query, keys = await search.by_name(db, models.Manufacturer, name)
+    page = await paginate(
+        db, query, keys,
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    if not page["items"] and page["offset"] == 0:
         raise HTTPException(status_code=404, detail="No manufacturers found matching the search criteria")
-    return result
+    return render(schemas.PaginatedResponse[schemas.Manufacturer], page)
+
+@router.get("/batch", response_model=schemas.BatchResponse[schemas.Manufacturer])
+async def get_manufacturers_batch(ids: str, db: AsyncSession = Depends(get_db)):
+    """Get several manufacturers by ID (`ids=1,2,3`), in the order asked for; unknown IDs are listed in `missing`."""
+    ids = batch.parse_ids(ids)
+    table = await cache.lookup_table(db, models.Manufacturer)
+    return render(schemas.BatchResponse[schemas.Manufacturer], batch.in_request_order(ids, table.by_id))
 
 @router.get("/{manufacturer_id}", response_model=schemas.Manufacturer)
-def get_manufacturer(manufacturer_id: int, db: Session = Depends(get_db)):
-    manufacturer = db.query(models.Manufacturer).filter(models.Manufacturer.manufacturer_id == manufacturer_id).first()
+async def get_manufacturer(manufacturer_id: int, db: AsyncSession = Depends(get_db)):
+    manufacturer = (await cache.lookup_table(db, models.Manufacturer)).by_id.get(manufacturer_id)
     if not manufacturer:
         raise HTTPException(status_code=404, detail="Manufacturer not found")
     return manufacturer
-
-@router.get("/{manufacturer_id}/firearms", response_model=List[schemas.Firearm])
-
-def get_firearms_for_manufacturer(request: Request, manufacturer_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of all firearms produced by a specific manufacturer.
-    """
-    db_manufacturer = db.query(models.Manufacturer).options(
-        joinedload(models.Manufacturer.firearms)
-    ).filter(models.Manufacturer.manufacturer_id == manufacturer_id).first()
-
-    if db_manufacturer is None:
-        raise HTTPException(status_code=404, detail="Manufacturer not found")
-    
-    return db_manufacturer.firearms
-
-@router.get("/{manufacturer_id}/firearms/names", response_model=List[schemas.FirearmName])
-def get_firearm_names_for_manufacturer(request: Request, manufacturer_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of firearm IDs and names produced by a specific manufacturer.
-    """
-    db_manufacturer = db.query(models.Manufacturer).options(
-        joinedload(models.Manufacturer.firearms)
-    ).filter(models.Manufacturer.manufacturer_id == manufacturer_id).first()
-
-    if db_manufacturer is None:
-        raise HTTPException(status_code=404, detail="Manufacturer not found")
-    
-    return db_manufacturer.firearms
\ No newline at end of file
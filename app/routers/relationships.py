@@ -0,0 +1,169 @@
+from typing import NamedTuple, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, raiseload
+
+from app import cache, includes, models, schemas, snapshot
+from app.conditional import conditional_get
+from app.database import get_db
+from app.pagination import paginate
+from app.serialization import render
+
+
+class Relation(NamedTuple):
+    """A many-to-many between firearms and a lookup table, by its junction table."""
+    name: str          # firearm-side path segment, e.g. "wars"
+    prefix: str        # the lookup's router prefix, e.g. "/war"
+    tag: str
+    model: type
+    schema: type
+    junction: object
+    key: str           # the lookup's column in `junction`, also its path parameter
+
+
+RELATIONS = (
+    Relation("types", "/type", "Type", models.Type, schemas.Type, models.firearm_types, "type_id"),
+    Relation("wars", "/war", "War", models.War, schemas.War, models.firearm_wars, "war_id"),
+    Relation("cartridges", "/cartridge", "Cartridge", models.Cartridge, schemas.Cartridge, models.firearm_cartridges, "cartridge_id"),
+    Relation("manufacturers", "/manufacturer", "Manufacturer", models.Manufacturer, schemas.Manufacturer, models.firearm_manufacturers, "manufacturer_id"),
+    Relation("variants", "/variant", "Variant", models.Variant, schemas.Variant, models.firearm_variants, "variant_id"),
+)
+
+
+def _firearms_of(relation: Relation, parent_id: int):
+    """Firearms linked to one lookup row, straight from the junction table."""
+    junction = relation.junction
+    return (
+        select(models.Firearm)
+        .join(junction, junction.c.firearm_id == models.Firearm.firearm_id)
+        .where(junction.c[relation.key] == parent_id)
+    )
+
+
+def lookup_router(relation: Relation) -> APIRouter:
+    """`/{lookup_id}/firearms` and `/{lookup_id}/firearms/names` for one lookup table."""
+    router = APIRouter(prefix=relation.prefix, tags=[relation.tag], dependencies=[Depends(conditional_get)])
+    singular = relation.tag.lower()
+
+    async def require_parent(db, parent_id):
+        if parent_id not in (await cache.lookup_table(db, relation.model)).by_id:
+            raise HTTPException(status_code=404, detail=f"{relation.tag} not found")
+
+    def snapshot_page(snap, parent_id, plan, offset, limit, cursor, include_total):
+        bitmap = snap.firearms_of(relation.name, parent_id)
+        if bitmap is None:
+            raise HTTPException(status_code=404, detail=f"{relation.tag} not found")
+        return snap.firearm_page(plan, offset=offset, limit=limit, cursor=cursor, include_total=include_total, bitmap=bitmap)
+
+    async def get_firearms(
+        parent_id: int = Path(alias=relation.key),
+        offset: int = 0,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        include: Optional[str] = None,
+        fields: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+    ):
+        plan = includes.plan(include, fields)
+        snap = await snapshot.active(db)
+        if snap is not None:
+            return render(schemas.PaginatedResponse[plan.schema], snapshot_page(snap, parent_id, plan, offset, limit, cursor, include_total))
+        await require_parent(db, parent_id)
+        page = await paginate(
+            db, _firearms_of(relation, parent_id).options(*plan.options()), [models.Firearm.firearm_id],
+            offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+        )
+        page["items"] = plan.expand_all(page["items"])
+        return render(schemas.PaginatedResponse[plan.schema], page)
+
+    async def get_firearm_names(
+        parent_id: int = Path(alias=relation.key),
+        offset: int = 0,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        db: AsyncSession = Depends(get_db),
+    ):
+        snap = await snapshot.active(db)
+        if snap is not None:
+            page = snapshot_page(snap, parent_id, includes.plan(fields="name"), offset, limit, cursor, include_total)
+            return render(schemas.PaginatedResponse[schemas.FirearmName], page)
+        await require_parent(db, parent_id)
+        stmt = _firearms_of(relation, parent_id).options(
+            load_only(models.Firearm.firearm_id, models.Firearm.name, raiseload=True), raiseload("*"),
+        )
+        page = await paginate(
+            db, stmt, [models.Firearm.firearm_id],
+            offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+        )
+        return render(schemas.PaginatedResponse[schemas.FirearmName], page)
+
+    get_firearms.__doc__ = f"""
+    Get the firearms linked to a {singular}, with pagination. Takes the same
+    `include` and `fields` parameters as `/firearm/`.
+    """
+    get_firearm_names.__doc__ = f"Get the IDs and names of the firearms linked to a {singular}, with pagination."
+    router.add_api_route(
+        f"/{{{relation.key}}}/firearms", get_firearms, methods=["GET"], name=f"get_firearms_for_{singular}",
+        response_model=schemas.PaginatedResponse[schemas.FirearmExpanded],
+    )
+    router.add_api_route(
+        f"/{{{relation.key}}}/firearms/names", get_firearm_names, methods=["GET"], name=f"get_firearm_names_for_{singular}",
+        response_model=schemas.PaginatedResponse[schemas.FirearmName],
+    )
+    return router
+
+
+def _add_related_route(router: APIRouter, relation: Relation):
+    pk = relation.model.__mapper__.primary_key[0]
+    junction = relation.junction
+
+    async def get_related(
+        firearm_id: int,
+        offset: int = 0,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        db: AsyncSession = Depends(get_db),
+    ):
+        snap = await snapshot.active(db)
+        if snap is not None:
+            page = snap.related(relation.name, firearm_id, offset=offset, limit=limit, cursor=cursor, include_total=include_total)
+            if page is None:
+                raise HTTPException(status_code=404, detail="Firearm not found")
+            return render(schemas.PaginatedResponse[relation.schema], page)
+        stmt = (
+            select(relation.model)
+            .join(junction, junction.c[relation.key] == pk)
+            .where(junction.c.firearm_id == firearm_id)
+        )
+        page = await paginate(
+            db, stmt, [pk],
+            offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+        )
+        # An empty first page is the only case that needs the firearm looked up
+        if not page["items"] and not cursor and not (await db.execute(
+            select(models.Firearm.firearm_id).where(models.Firearm.firearm_id == firearm_id)
+        )).first():
+            raise HTTPException(status_code=404, detail="Firearm not found")
+        return render(schemas.PaginatedResponse[relation.schema], page)
+
+    get_related.__doc__ = f"Get the {relation.name} linked to a firearm, with pagination."
+    router.add_api_route(
+        f"/{{firearm_id}}/{relation.name}", get_related, methods=["GET"], name=f"get_{relation.name}_for_firearm",
+        response_model=schemas.PaginatedResponse[relation.schema],
+    )
+
+
+def firearm_router() -> APIRouter:
+    """`/firearm/{firearm_id}/<relation>` for every relation."""
+    router = APIRouter(prefix="/firearm", tags=["Firearm"], dependencies=[Depends(conditional_get)])
+    for relation in RELATIONS:
+        _add_related_route(router, relation)
+    return router
+
+
+routers = [firearm_router(), *(lookup_router(relation) for relation in RELATIONS)]
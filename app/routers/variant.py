@@ -0,0 +1,63 @@
+from fastapi import APIRouter
+from app import schemas, models, batch, search, cache
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db
+from app.conditional import conditional_get
+from app.serialization import render
+from app.pagination import paginate, paginate_rows
+from fastapi import Depends, HTTPException
+router = APIRouter(prefix="/variant", tags=["Variant"], dependencies=[Depends(conditional_get)])
+
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.Variant])
+async def get_variants(
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get all variants with pagination. Default limit=50, max limit=200."""
+    page = paginate_rows(
+        (await cache.lookup_table(db, models.Variant)).rows, "variant_id",
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    return render(schemas.PaginatedResponse[schemas.Variant], page)
+
+@router.get("/search", response_model=schemas.PaginatedResponse[schemas.Variant])
+async def search_variants(
+    name: str,
+    offset: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search for variants by name (case-insensitive, partial match), ranked by relevance.
+    """
+    if not name:
+        raise HTTPException(status_code=400, detail="Name query parameter is required")
+    
+    query, keys = await search.by_name(db, models.Variant, name)
+    page = await paginate(
+        db, query, keys,
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    if not page["items"] and page["offset"] == 0:
+        raise HTTPException(status_code=404, detail="No variants found matching the search criteria")
+    return render(schemas.PaginatedResponse[schemas.Variant], page)
+
+@router.get("/batch", response_model=schemas.BatchResponse[schemas.Variant])
+async def get_variants_batch(ids: str, db: AsyncSession = Depends(get_db)):
+    """Get several variants by ID (`ids=1,2,3`), in the order asked for; unknown IDs are listed in `missing`."""
+    ids = batch.parse_ids(ids)
+    table = await cache.lookup_table(db, models.Variant)
+    return render(schemas.BatchResponse[schemas.Variant], batch.in_request_order(ids, table.by_id))
+
+@router.get("/{variant_id}", response_model=schemas.Variant)
+async def get_variant(variant_id: int, db: AsyncSession = Depends(get_db)):
+    variant = (await cache.lookup_table(db, models.Variant)).by_id.get(variant_id)
+    if not variant:
+        raise HTTPException(status_code=404, detail="Variant not found")
+    return variant
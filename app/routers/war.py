@@ -1,101 +1,66 @@
 from fastapi import APIRouter, Request, HTTPException
-from app import schemas, models
-from typing import List
-from sqlalchemy.orm import Session, joinedload
+from app import schemas, models, batch, search, cache
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from app.conditional import conditional_get
+from app.serialization import render
+from app.pagination import paginate, paginate_rows
 from fastapi import Depends
-router = APIRouter(prefix="/war", tags=["War"])
+router = APIRouter(prefix="/war", tags=["War"], dependencies=[Depends(conditional_get)])
 
-@router.get("/")
-def get_wars(
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.War])
+async def get_wars(
     offset: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all wars with pagination. Default limit=50, max limit=200."""
-    if limit > 200:
-        limit = 200
-    if offset < 0:
-        offset = 0
-    
-    total = db.query(models.War).count()
-    items = db.query(models.War).offset(offset).limit(limit).all()
-    
-    return {
-        "items": items,
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "has_more": offset + limit < total
-    }
+    page = paginate_rows(
+        (await cache.lookup_table(db, models.War)).rows, "war_id",
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
+    return render(schemas.PaginatedResponse[schemas.War], page)
 
-@router.get("/search/")
-def search_wars(
+@router.get("/search/", response_model=schemas.PaginatedResponse[schemas.War])
+async def search_wars(
     query: str,
     offset: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Search for wars by name with pagination."""
+    """Search for wars by name with pagination, ranked by relevance."""
     if not query:
         raise HTTPException(status_code=400, detail="A search query must be provided.")
-    if limit > 200:
-        limit = 200
-    if offset < 0:
-        offset = 0
     
-    q = db.query(models.War).filter(models.War.name.ilike(f"%{query}%"))
-    total = q.count()
-    items = q.offset(offset).limit(limit).all()
+    q, keys = await search.by_name(db, models.War, query)
+    page = await paginate(
+        db, q, keys,
+        offset=offset, limit=limit, cursor=cursor, include_total=include_total,
+    )
     
-    if total == 0:
+    if not page["items"] and page["offset"] == 0:
         raise HTTPException(status_code=404, detail=f"No wars found matching '{query}'")
         
-    return {
-        "items": items,
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "has_more": offset + limit < total
-    }
+    return render(schemas.PaginatedResponse[schemas.War], page)
+
+@router.get("/batch", response_model=schemas.BatchResponse[schemas.War])
+async def get_wars_batch(ids: str, db: AsyncSession = Depends(get_db)):
+    """Get several wars by ID (`ids=1,2,3`), in the order asked for; unknown IDs are listed in `missing`."""
+    ids = batch.parse_ids(ids)
+    table = await cache.lookup_table(db, models.War)
+    return render(schemas.BatchResponse[schemas.War], batch.in_request_order(ids, table.by_id))
 
 @router.get("/{war_id}", response_model=schemas.War)
-def get_war_by_id(request: Request, war_id: int, db: Session = Depends(get_db)):
+async def get_war_by_id(request: Request, war_id: int, db: AsyncSession = Depends(get_db)):
     """
     Get details for a specific war by its ID.
     """
-    db_war = db.query(models.War).filter(models.War.war_id == war_id).first()
+    db_war = (await cache.lookup_table(db, models.War)).by_id.get(war_id)
     if db_war is None:
         raise HTTPException(status_code=404, detail="War not found")
     return db_war
-
-@router.get("/{war_id}/firearms", response_model=List[schemas.Firearm])
-def get_firearms_for_war(request: Request, war_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of all firearms used in a specific war.
-    """
-    # Eagerly load the related firearms to avoid session closing issues
-    db_war = db.query(models.War).options(
-        joinedload(models.War.firearms)
-    ).filter(models.War.war_id == war_id).first()
-
-    if db_war is None:
-        raise HTTPException(status_code=404, detail="War not found")
-    
-    return db_war.firearms
-
-@router.get("/{war_id}/firearms/names", response_model=List[schemas.FirearmName])
-def get_firearm_names_for_war(request: Request, war_id: int, db: Session = Depends(get_db)):
-    """
-    Get a list of firearm IDs and names used in a specific war.
-    """
-    # Eagerly load the related firearms
-    db_war = db.query(models.War).options(
-        joinedload(models.War.firearms)
-    ).filter(models.War.war_id == war_id).first()
-
-    if db_war is None:
-        raise HTTPException(status_code=404, detail="War not found")
-    
-    # Return the full firearm objects; FastAPI will serialize them using the FirearmName schema
-    return db_war.firearms
\ No newline at end of file
@@ -1,15 +1,65 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional, List, Generic, TypeVar
+from typing import Any, Dict, Optional, List, Generic, Literal, TypeVar
 
 T = TypeVar('T')
 
 class PaginatedResponse(BaseModel, Generic[T]):
-    """Standard paginated response wrapper."""
+    """
+    Standard paginated response wrapper.
+
+    Pages can be walked either with `offset` or by passing the previous page's
+    `next_cursor` back as `cursor`. `offset` is null for cursor pages.
+    `total` is null when the caller passed `include_total=false`, and
+    `total_estimated` is set when it comes from planner statistics.
+    """
     items: List[T]
-    total: int
-    offset: int
+    total: Optional[int] = None
+    total_estimated: bool = False
+    offset: Optional[int] = None
     limit: int
     has_more: bool
+    next_cursor: Optional[str] = None
+
+
+class FacetCount(BaseModel):
+    id: int
+    name: Optional[str] = None
+    count: int
+
+
+class FacetedResponse(PaginatedResponse[T], Generic[T]):
+    """A filtered page plus, per facet, how many matches link to each value."""
+    facets: Dict[str, List[FacetCount]] = {}
+
+
+class BatchResponse(BaseModel, Generic[T]):
+    """Rows fetched by id, in the order requested; ids that don't exist are listed in `missing`."""
+    items: List[T]
+    missing: List[int] = []
+
+
+class CompositeItem(BaseModel):
+    """One sub-request of POST /batch, e.g. `{"id": "wars", "path": "/api/v1/firearm/1/wars?limit=5"}`."""
+    id: Optional[str] = None
+    method: Literal["GET"] = "GET"
+    path: str
+    headers: Dict[str, str] = {}
+
+
+class CompositeRequest(BaseModel):
+    requests: List[CompositeItem]
+
+
+class CompositeResult(BaseModel):
+    id: str
+    status: int
+    headers: Dict[str, str]
+    body: Any = None
+
+
+class CompositeResponse(BaseModel):
+    """Sub-responses in request order; `id` is the sub-request's, or its position."""
+    responses: List[CompositeResult]
 
 
 class War(BaseModel):
@@ -23,6 +73,7 @@ class Cartridge(BaseModel):
     cartridge_id: int
     name: str
 
+    model_config = ConfigDict(from_attributes=True)
 
 
 class FirearmBase(BaseModel):
@@ -47,44 +98,64 @@ class Firearm(FirearmBase):
 
 
 
-class Manufacturer(BaseModel):
-    manufacturer_id: int
-    name: str
+class FirearmImport(FirearmBase):
+    """One record of a bulk import; relationships are given by name."""
+    types: List[str] = []
+    wars: List[str] = []
+    cartridges: List[str] = []
+    manufacturers: List[str] = []
+    variants: List[str] = []
 
-    model_config = ConfigDict(from_attributes=True)
 
+class BulkImportError(BaseModel):
+    line: int
+    name: Optional[str] = None
+    error: str
 
-class NameWithManufacturer(BaseModel):
-    firearm_id: int
+
+class BulkImportResult(BaseModel):
+    rows: int
+    imported: int
+    failed: int
+    errors: List[BulkImportError]
+
+
+class Manufacturer(BaseModel):
+    manufacturer_id: int
     name: str
 
     model_config = ConfigDict(from_attributes=True)
 
 
-class NameWithCartridge(BaseModel):
+class FirearmName(BaseModel):
     firearm_id: int
     name: str
 
     model_config = ConfigDict(from_attributes=True)
 
 
-class NameWithType(BaseModel):
-    firearm_id: int
+class Type(BaseModel):
+    type_id: int
     name: str
 
     model_config = ConfigDict(from_attributes=True)
 
 
-class FirearmName(BaseModel):
-    firearm_id: int
+class Variant(BaseModel):
+    variant_id: int
     name: str
 
     model_config = ConfigDict(from_attributes=True)
 
 
-class Type(BaseModel):
-    type_id: int
-    name: str
+class FirearmExpanded(FirearmBase):
+    """A firearm with the relationships chosen by `include=`; those not included are null."""
+    firearm_id: int
+    types: Optional[List[Type]] = None
+    wars: Optional[List[War]] = None
+    cartridges: Optional[List[Cartridge]] = None
+    manufacturers: Optional[List[Manufacturer]] = None
+    variants: Optional[List[Variant]] = None
 
     model_config = ConfigDict(from_attributes=True)
 
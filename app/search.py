@@ -0,0 +1,32 @@
+from sqlalchemy import Double, cast, func, or_, select, text
+
+from app.config import settings
+from app.pagination import SortKey
+
+
+async def by_name(db, model, term: str):
+    """
+    Build a name search over `model` and the keys to page it by.
+
+    On PostgreSQL the match goes through the `pg_trgm` GIN index on `name`:
+    substrings match as before, names within `SEARCH_SIMILARITY_THRESHOLD`
+    of the term match too (so typos still find something), and results are
+    ranked by similarity. Other databases fall back to a plain `ilike`
+    ordered by name.
+    """
+    column = model.name
+    pk = model.__mapper__.primary_key[0]
+    stmt = select(model)
+
+    if db.get_bind().dialect.name != "postgresql":
+        return stmt.where(column.ilike(f"%{term}%")), [column, pk]
+
+    # `%` compares against this setting; is_local keeps it to the current transaction
+    await db.execute(
+        text("SELECT set_config('pg_trgm.similarity_threshold', :threshold, true)"),
+        {"threshold": str(settings.SEARCH_SIMILARITY_THRESHOLD)},
+    )
+    # similarity() returns real; widen it so the value round-trips through a cursor exactly
+    score = cast(func.similarity(column, term), Double).label("score")
+    stmt = stmt.where(or_(column.ilike(f"%{term}%"), column.op("%")(term)))
+    return stmt, [SortKey(score, descending=True), column, pk]
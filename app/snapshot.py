@@ -0,0 +1,342 @@
+import asyncio
+import bisect
+import logging
+import os
+from typing import Dict, List, Optional, Sequence
+
+import orjson
+from sqlalchemy import select
+
+from app import models, schemas, versioning
+from app.bulk_import import RELATIONS
+from app.config import settings
+from app.includes import FIREARM_COLUMNS
+from app.pagination import DEFAULT_LIMIT, clamp_limit, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Reads of the catalog before `dump` gives up on writes racing it
+DUMP_ATTEMPTS = 3
+
+LOOKUP_SCHEMAS = {
+    "types": schemas.Type,
+    "wars": schemas.War,
+    "cartridges": schemas.Cartridge,
+    "manufacturers": schemas.Manufacturer,
+    "variants": schemas.Variant,
+}
+
+
+# Bitmaps are paged through in chunks of this many bytes
+CHUNK_BYTES = 512
+
+
+def _bits(bitmap: int):
+    """Yield the positions set in `bitmap`, lowest first. Each step copies `bitmap`, so keep it small."""
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def _bitmap(positions: Sequence[int]) -> int:
+    """The bitmap with `positions` set, built in one pass."""
+    if not positions:
+        return 0
+    data = bytearray((max(positions) >> 3) + 1)
+    for i in positions:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, "little")
+
+
+def _positions(bitmap: int, skip: int, count: int) -> List[int]:
+    """
+    Up to `count` positions set in `bitmap`, after skipping the first `skip`.
+    Chunks are skipped whole by their `bit_count()`, so an offset costs one
+    pass over the bitmap's bytes, not one step per skipped position.
+    """
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, "little")
+    positions = []
+    for base in range(0, len(data), CHUNK_BYTES):
+        chunk = int.from_bytes(data[base:base + CHUNK_BYTES], "little")
+        if skip:
+            ones = chunk.bit_count()
+            if ones <= skip:
+                skip -= ones
+                continue
+        for bit in _bits(chunk):
+            if skip:
+                skip -= 1
+                continue
+            positions.append(base * 8 + bit)
+            if len(positions) == count:
+                return positions
+    return positions
+
+
+class Snapshot:
+    """
+    The whole catalog in memory, read-only, as of one catalog version.
+
+    Firearms are stored column-wise in lists ordered by `firearm_id`; a
+    firearm's position in them is its bit in every bitmap. Each junction
+    table becomes one bitmap (a Python int) per lookup id, so filters are
+    ANDs and ORs of ints and counts are `bit_count()`. The reverse direction
+    (firearm -> lookup ids) is kept as a sorted tuple per position.
+    """
+
+    def __init__(self, data: dict):
+        self.version = data["version"]
+        self.columns = {column: data["firearms"][column] for column in FIREARM_COLUMNS}
+        self.ids = self.columns["firearm_id"]
+        self.size = len(self.ids)
+        self.everything = (1 << self.size) - 1
+        position = {firearm_id: i for i, firearm_id in enumerate(self.ids)}
+
+        self.lookups = {}
+        self.bitmaps = {}
+        self.linked = {}
+        # Links to a firearm or lookup row missing from `data` are left out
+        self.dangling = 0
+        for field, schema in LOOKUP_SCHEMAS.items():
+            pk = RELATIONS[field][0].__mapper__.primary_key[0].key
+            self.lookups[field] = {lookup_id: schema(**{pk: lookup_id, "name": name}) for lookup_id, name in data["lookups"][field]}
+            members = {lookup_id: [] for lookup_id in self.lookups[field]}
+            # Only firearms with links get a list; the rest share one empty tuple
+            linked = {}
+            for firearm_id, lookup_id in sorted(data["links"][field]):
+                i = position.get(firearm_id)
+                if i is None or lookup_id not in members:
+                    self.dangling += 1
+                    continue
+                members[lookup_id].append(i)
+                linked.setdefault(i, []).append(lookup_id)
+            self.bitmaps[field] = {lookup_id: _bitmap(positions) for lookup_id, positions in members.items()}
+            self.linked[field] = [()] * self.size
+            for i, ids in linked.items():
+                self.linked[field][i] = tuple(ids)
+        if self.dangling:
+            logger.warning("Snapshot %s: skipped %d links to missing rows", self.version, self.dangling)
+
+    def _firearm(self, i: int, plan) -> dict:
+        row = {column: self.columns[column][i] for column in plan.columns}
+        for field in plan.include:
+            row[field] = [self.lookups[field][lookup_id] for lookup_id in self.linked[field][i]]
+        return row
+
+    def _page(self, bitmap: int, offset, limit, cursor, include_total, render_row) -> dict:
+        """
+        A `PaginatedResponse`-shaped page of the positions set in `bitmap`.
+        Unfiltered pages are sliced directly; filtered ones cost a pass over
+        the bitmap up to the page, so deep offsets into large filtered
+        results are linear in the catalog size (cursors start at the page).
+        """
+        limit = clamp_limit(limit)
+        start = 0
+        if cursor is not None:
+            (last,) = decode_cursor(cursor, 1)
+            start = bisect.bisect_right(self.ids, last)
+            offset = None
+            skip = 0
+        else:
+            offset = max(offset, 0)
+            skip = offset
+        if bitmap == self.everything:
+            positions = list(range(start + skip, min(self.size, start + skip + limit + 1)))
+        else:
+            positions = [start + i for i in _positions(bitmap >> start, skip, limit + 1)]
+        has_more = len(positions) > limit
+        positions = positions[:limit]
+        return {
+            "items": [render_row(i) for i in positions],
+            "total": bitmap.bit_count() if include_total else None,
+            "offset": offset,
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": encode_cursor([self.ids[positions[-1]]]) if has_more and positions else None,
+        }
+
+    def firearm_page(self, plan, offset=0, limit=DEFAULT_LIMIT, cursor=None, include_total=True, bitmap=None) -> dict:
+        bitmap = self.everything if bitmap is None else bitmap
+        return self._page(bitmap, offset, limit, cursor, include_total, lambda i: self._firearm(i, plan))
+
+    def firearm(self, firearm_id: int, plan) -> Optional[dict]:
+        i = bisect.bisect_left(self.ids, firearm_id)
+        if i == self.size or self.ids[i] != firearm_id:
+            return None
+        return self._firearm(i, plan)
+
+    def firearms_by_id(self, ids: Sequence[int], plan) -> Dict[int, dict]:
+        return {firearm_id: row for firearm_id in ids if (row := self.firearm(firearm_id, plan)) is not None}
+
+    def firearms_of(self, field: str, lookup_id: int) -> Optional[int]:
+        """The bitmap of firearms linked to one lookup row, or None if the row doesn't exist."""
+        if lookup_id not in self.lookups[field]:
+            return None
+        return self.bitmaps[field].get(lookup_id, 0)
+
+    def related(self, field: str, firearm_id: int, offset=0, limit=DEFAULT_LIMIT, cursor=None, include_total=True) -> Optional[dict]:
+        """A page of the lookup rows linked to a firearm, ordered by id, or None if the firearm doesn't exist."""
+        i = bisect.bisect_left(self.ids, firearm_id)
+        if i == self.size or self.ids[i] != firearm_id:
+            return None
+        linked = self.linked[field][i]
+        limit = clamp_limit(limit)
+        if cursor is not None:
+            (last,) = decode_cursor(cursor, 1)
+            start, offset = bisect.bisect_right(linked, last), None
+        else:
+            start = offset = max(offset, 0)
+        page = linked[start:start + limit]
+        has_more = start + limit < len(linked)
+        return {
+            "items": [self.lookups[field][lookup_id] for lookup_id in page],
+            "total": len(linked) if include_total else None,
+            "offset": offset,
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": encode_cursor([page[-1]]) if has_more and page else None,
+        }
+
+    def filter(self, filters: Dict[str, Sequence[int]], facets: Sequence[str], plan, offset=0, limit=DEFAULT_LIMIT, cursor=None) -> dict:
+        """Same result as `facets.filter_firearms` followed by `facets.load_page`."""
+        matched = self.everything
+        for field, ids in filters.items():
+            union = 0
+            for lookup_id in ids:
+                union |= self.bitmaps[field].get(lookup_id, 0)
+            matched &= union
+        page = self.firearm_page(plan, offset, limit, cursor, True, bitmap=matched)
+        page["facets"] = {}
+        for field in facets:
+            counts = [
+                {"id": lookup_id, "name": self.lookups[field][lookup_id].name, "count": count}
+                for lookup_id, bitmap in self.bitmaps[field].items()
+                if (count := (bitmap & matched).bit_count())
+            ]
+            page["facets"][field] = sorted(counts, key=lambda item: (-item["count"], item["id"]))
+        return page
+
+
+async def dump(db) -> dict:
+    """
+    Read the catalog into the plain structure a `Snapshot` (and its file) is
+    built from, in one transaction on a connection of its own. On PostgreSQL
+    it is a read-only REPEATABLE READ transaction, so every table is read as
+    of the same moment. The version is read first and last, and the read is
+    retried if a write got in between.
+    """
+    columns = [getattr(models.Firearm, column) for column in FIREARM_COLUMNS]
+    for _ in range(DUMP_ATTEMPTS):
+        async with db.bind.connect() as connection:
+            if connection.dialect.name == "postgresql":
+                await connection.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+            async with connection.begin():
+                version = await versioning.read(connection)
+                rows = (await connection.execute(select(*columns).order_by(models.Firearm.firearm_id))).all()
+                data = {
+                    "version": version,
+                    "firearms": {column: [row[i] for row in rows] for i, column in enumerate(FIREARM_COLUMNS)},
+                    "lookups": {},
+                    "links": {},
+                }
+                for field, (model, junction, key) in RELATIONS.items():
+                    pk = model.__mapper__.primary_key[0]
+                    data["lookups"][field] = [list(row) for row in (await connection.execute(select(pk, model.name).order_by(pk))).all()]
+                    data["links"][field] = [list(row) for row in (await connection.execute(select(junction.c.firearm_id, junction.c[key]))).all()]
+                if await versioning.read(connection) == version:
+                    return data
+        logger.info("Catalog changed while reading snapshot %s, reading again", version)
+    raise RuntimeError(f"Catalog kept changing during {DUMP_ATTEMPTS} snapshot reads")
+
+
+def _split_s3(path: str):
+    bucket, _, key = path.removeprefix("s3://").partition("/")
+    return bucket, key
+
+
+def read_file(path: str) -> Optional[dict]:
+    """Load a snapshot file from a local path or `s3://bucket/key`; None if there isn't one."""
+    try:
+        if path.startswith("s3://"):
+            import boto3  # only needed for S3 snapshots; present on the Lambda runtime
+
+            bucket, key = _split_s3(path)
+            body = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()
+        else:
+            with open(path, "rb") as f:
+                body = f.read()
+    except Exception as exc:
+        logger.info("No snapshot loaded from %s: %s", path, exc)
+        return None
+    return orjson.loads(body)
+
+
+def write_file(path: str, data: dict):
+    body = orjson.dumps(data)
+    if path.startswith("s3://"):
+        import boto3
+
+        bucket, key = _split_s3(path)
+        boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=body)
+        return
+    # Write then rename, so a concurrent reader never sees half a file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+_current: Optional[Snapshot] = None
+# The reload lock and the event loop it belongs to
+_lock = None
+_lock_loop = None
+
+
+def _loop_lock() -> asyncio.Lock:
+    """The reload lock for the running event loop; a new loop (e.g. a new test client) gets a new one."""
+    global _lock, _lock_loop
+    loop = asyncio.get_running_loop()
+    if _lock_loop is not loop:
+        _lock_loop, _lock = loop, asyncio.Lock()
+    return _lock
+
+
+async def active(db) -> Optional[Snapshot]:
+    """
+    The snapshot for the current catalog version, or None when `SNAPSHOT_MODE` is off.
+
+    On a version change the snapshot is reloaded: from `SNAPSHOT_PATH` if the
+    file there is current, otherwise from the database through `db`, and then
+    written back to `SNAPSHOT_PATH` for the next container.
+    """
+    global _current
+    if not settings.SNAPSHOT_MODE:
+        return None
+    version = await versioning.current(db)
+    snapshot = _current
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    async with _loop_lock():
+        if _current is not None and _current.version == version:
+            return _current
+        data = read_file(settings.SNAPSHOT_PATH) if settings.SNAPSHOT_PATH else None
+        if data is not None and data.get("version") == version:
+            _current = Snapshot(data)
+            return _current
+        data = await dump(db)
+        # Built before writing, so a file is only shared once it loads
+        _current = Snapshot(data)
+        if settings.SNAPSHOT_PATH:
+            try:
+                write_file(settings.SNAPSHOT_PATH, data)
+            except Exception as exc:
+                logger.warning("Could not write snapshot to %s: %s", settings.SNAPSHOT_PATH, exc)
+        return _current
+
+
+def forget():
+    """Drop the in-memory snapshot; the next `active` call reloads it."""
+    global _current
+    _current = None
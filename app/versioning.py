@@ -0,0 +1,53 @@
+import threading
+import time
+
+from sqlalchemy import select, update
+
+from app import models
+from app.config import settings
+
+_lock = threading.Lock()
+_cached = None
+
+
+async def current(db) -> int:
+    """
+    The catalog data version. Re-read from the database at most once every
+    `VERSION_CHECK_TTL` seconds, so most requests never query it.
+    """
+    global _cached
+    now = time.monotonic()
+    with _lock:
+        if _cached is not None and _cached[0] > now:
+            return _cached[1]
+
+    version = await read(db)
+    with _lock:
+        _cached = (now + settings.VERSION_CHECK_TTL, version)
+    return version
+
+
+async def read(db) -> int:
+    """The catalog version as `db` (a session or connection) sees it, bypassing the cache."""
+    version = (await db.execute(
+        select(models.CatalogVersion.version).where(models.CatalogVersion.id == 1)
+    )).scalar()
+    return version or 0
+
+
+async def bump(db):
+    """Increment the catalog version inside the caller's transaction."""
+    result = await db.execute(
+        update(models.CatalogVersion)
+        .where(models.CatalogVersion.id == 1)
+        .values(version=models.CatalogVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(models.CatalogVersion(id=1, version=1))
+
+
+def forget():
+    """Make the next `current` call re-read the version."""
+    global _cached
+    with _lock:
+        _cached = None
@@ -0,0 +1 @@
+"""Reproducible performance benchmarks. Each module is runnable with `python -m benchmarks.<name>`."""
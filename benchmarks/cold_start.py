@@ -0,0 +1,107 @@
+"""
+Cold-start benchmark: import time of `app.main` and the first request through
+the Lambda `handler`, each measured in a fresh interpreter.
+
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --json > cold_start.json
+
+The request goes to `/` so no database is needed. Compare the numbers (and
+the heaviest imports) before and after a change to spot regressions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_ENV = {
+    "DB_SERVER": "localhost",
+    "DB_NAME": "bench",
+    "DB_USER": "bench",
+    "DB_PORT": "5432",
+    "DB_PASSWORD": "bench",
+    "SECRET_KEY": "bench",
+}
+
+FIRST_REQUEST = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+event = {
+    "resource": "/", "path": "/", "httpMethod": "GET",
+    "headers": {"Host": "localhost"}, "multiValueHeaders": {"Host": ["localhost"]},
+    "queryStringParameters": None, "multiValueQueryStringParameters": None,
+    "requestContext": {"resourcePath": "/", "httpMethod": "GET", "path": "/Prod/", "stage": "Prod",
+                       "identity": {"sourceIp": "127.0.0.1"}},
+    "pathParameters": None, "stageVariables": None, "body": None, "isBase64Encoded": False,
+}
+response = app.main.handler(event, None)
+done = time.perf_counter()
+assert response["statusCode"] == 200, response
+heavy = [m for m in ("mangum", "passlib", "jose", "psycopg2", "brotli", "zstandard") if m in sys.modules]
+print(json.dumps({"import_s": imported - start, "first_request_s": done - imported, "loaded": heavy}))
+"""
+
+
+def _env():
+    env = dict(DEFAULT_ENV)
+    env.update(os.environ)
+    return env
+
+
+def measure_run():
+    out = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST], env=_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def heaviest_imports(top: int):
+    """Modules with the largest cumulative import time, from `python -X importtime`."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=_env(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        rows.append((int(cumulative_us), int(self_us), name))
+    return [
+        {"module": name, "cumulative_ms": cumulative / 1000, "self_ms": own / 1000}
+        for cumulative, own, name in sorted(rows, reverse=True)[:top]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    runs = [measure_run() for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "import_ms_median": statistics.median(r["import_s"] for r in runs) * 1000,
+        "first_request_ms_median": statistics.median(r["first_request_s"] for r in runs) * 1000,
+        "heavy_modules_loaded": sorted({m for r in runs for m in r["loaded"]}),
+        "heaviest_imports": heaviest_imports(args.top),
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"import app.main      {result['import_ms_median']:8.1f} ms (median of {args.runs})")
+    print(f"first request (/)    {result['first_request_ms_median']:8.1f} ms")
+    print(f"loaded by 1st request {', '.join(result['heavy_modules_loaded']) or 'none'}")
+    print("\nheaviest imports (cumulative / self ms)")
+    for row in result["heaviest_imports"]:
+        print(f"  {row['cumulative_ms']:8.1f} {row['self_ms']:8.1f}  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
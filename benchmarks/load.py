@@ -0,0 +1,179 @@
+"""
+Replay a weighted request mix against the API and report latency percentiles,
+throughput and SQL statements per endpoint.
+
+    python -m benchmarks.catalog --firearms 100000 --url sqlite:///./bench.db --reset
+    python -m benchmarks.load --url sqlite:///./bench.db --firearms 100000 --requests 5000 --concurrency 16
+    python -m benchmarks.load --base-url http://localhost:8000 --firearms 100000   # e.g. docker compose up
+    python -m benchmarks.load ... --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.load ... --baseline benchmarks/baselines/local.json --tolerance 0.2
+
+By default requests go to the ASGI app in this process (with rate limiting
+off), against the database at `--url`. With `--base-url` they go over HTTP
+instead. Statement counts and DB time come from the `Server-Timing` header
+either way.
+
+A mix is JSONL, one endpoint per line:
+
+    {"name": "war firearms", "method": "GET", "path": "/api/v1/war/{war_id}/firearms", "weight": 10}
+
+`{firearm_id}`, `{war_id}`, `{type_id}`, `{cartridge_id}`, `{manufacturer_id}`
+and `{variant_id}` are replaced by random ids of the catalog that
+`benchmarks.catalog` generates for `--firearms`; `{firearm_ids}` by 20 of
+them, `{firearm_cursor}` by a cursor into the firearm list and `{term}` by a
+search term. With `--baseline` the exit status is 1 if an endpoint's p95 got
+worse by more than `--tolerance` or it runs noticeably more SQL statements
+than before (`--statement-tolerance`).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import List
+
+from benchmarks import catalog, report
+
+DEFAULT_MIX = os.path.join(os.path.dirname(__file__), "mixes", "default.jsonl")
+ID_FIELDS = {
+    "firearm_id": "firearms",
+    "war_id": "wars",
+    "type_id": "types",
+    "cartridge_id": "cartridges",
+    "manufacturer_id": "manufacturers",
+    "variant_id": "variants",
+}
+
+
+def load_mix(path: str) -> List[dict]:
+    with open(path) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    for entry in entries:
+        entry.setdefault("method", "GET")
+        entry.setdefault("weight", 1)
+        entry.setdefault("name", entry["path"])
+    return entries
+
+
+class Placeholders(dict):
+    """Random values for the `{…}` placeholders of a mix path."""
+
+    def __init__(self, rng: random.Random, firearms: int):
+        super().__init__()
+        self.rng = rng
+        self.sizes = catalog.sizes(firearms)
+
+    def __missing__(self, name):
+        from app.pagination import encode_cursor
+
+        if name in ID_FIELDS:
+            return catalog.skewed(self.rng, self.sizes[ID_FIELDS[name]])
+        if name == "firearm_ids":
+            return ",".join(str(self.rng.randint(1, self.sizes["firearms"])) for _ in range(20))
+        if name == "firearm_cursor":
+            return encode_cursor([self.rng.randint(1, self.sizes["firearms"])])
+        if name == "term":
+            return self.rng.choice(catalog.MAKERS)
+        raise KeyError(name)
+
+
+def plan_requests(mix: List[dict], count: int, firearms: int, seed: int):
+    """The (endpoint name, method, path) of every request of the run, drawn by weight."""
+    rng = random.Random(seed)
+    entries = rng.choices(mix, weights=[entry["weight"] for entry in mix], k=count)
+    return [(entry["name"], entry["method"], entry["path"].format_map(Placeholders(rng, firearms))) for entry in entries]
+
+
+async def replay(client, planned, concurrency: int) -> List[report.Sample]:
+    samples = []
+    queue = iter(planned)
+
+    async def worker():
+        for name, method, path in queue:
+            started = time.perf_counter()
+            response = await client.request(method, path)
+            elapsed = time.perf_counter() - started
+            statements, db_seconds = report.parse_server_timing(response.headers.get("server-timing"))
+            samples.append(report.Sample(name, response.status_code, elapsed, statements, db_seconds))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def in_process_client():
+    """An httpx client calling the ASGI app directly."""
+    import httpx
+
+    from app.main import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark")
+
+
+async def run(args) -> dict:
+    import httpx
+
+    planned = plan_requests(load_mix(args.mix), args.warmup + args.requests, args.firearms, args.seed)
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+    else:
+        client = in_process_client()
+    async with client:
+        # Warm caches and connections, then measure
+        await replay(client, planned[:args.warmup], args.concurrency)
+        started = time.perf_counter()
+        samples = await replay(client, planned[args.warmup:], args.concurrency)
+        elapsed = time.perf_counter() - started
+    if not args.base_url:
+        # Pooled aiosqlite connections run on threads that would keep the process alive
+        from app.database import get_async_engine
+
+        await get_async_engine().dispose()
+    return report.summarize(samples, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="JSONL request mix (default: benchmarks/mixes/default.jsonl)")
+    parser.add_argument("--url", default="sqlite:///./bench.db", help="database for the in-process app (default: %(default)s)")
+    parser.add_argument("--base-url", help="send requests over HTTP to this server instead")
+    parser.add_argument("--firearms", type=int, default=100000, help="catalog size passed to benchmarks.catalog")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the summary as a baseline file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth against the baseline (default: %(default)s)")
+    parser.add_argument("--statement-tolerance", type=float, default=0.1, help="allowed growth of statements per request (default: %(default)s)")
+    args = parser.parse_args()
+
+    # Settings are read when `app` is first imported, so set them up first
+    for key, value in catalog.DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    if not args.base_url:
+        os.environ["DATABASE_URL"] = args.url
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, indent=2) if args.json else report.format_table(summary))
+
+    meta = {"firearms": args.firearms, "seed": args.seed, "requests": args.requests, "concurrency": args.concurrency,
+            "target": args.base_url or "in-process"}
+    if args.save_baseline:
+        report.save_baseline(args.save_baseline, summary, meta)
+    if args.baseline:
+        baseline = report.load_baseline(args.baseline)
+        if (baseline.get("firearms"), baseline.get("seed"), baseline.get("requests")) != (args.firearms, args.seed, args.requests):
+            print("warning: the baseline was recorded with a different --firearms, --seed or --requests", file=sys.stderr)
+        regressions = report.compare(summary, baseline, args.tolerance, args.statement_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Latency, throughput and SQL statement summaries of a load run, and their
+comparison with a saved JSON baseline. Used by `benchmarks.load`.
+"""
+import json
+import statistics
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Sample(NamedTuple):
+    """One request of a load run."""
+    endpoint: str
+    status: int
+    seconds: float
+    statements: Optional[int]
+    db_seconds: Optional[float]
+
+
+def parse_server_timing(header: Optional[str]):
+    """(statements, db seconds) from the app's `Server-Timing` header; (None, None) if absent."""
+    if not header:
+        return None, None
+    for metric in header.split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        if name != "db":
+            continue
+        statements = db_seconds = None
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                db_seconds = float(value) / 1000
+            elif key == "desc":
+                statements = int(value.strip('"').split()[0])
+        return statements, db_seconds
+    return None, None
+
+
+def _percentile(values: List[float], q: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def summarize(samples: List[Sample], elapsed: float) -> dict:
+    """Per-endpoint and overall p50/p95/p99 latency (ms), throughput and mean statements per request."""
+    def stats(group: List[Sample]) -> dict:
+        latencies = [sample.seconds * 1000 for sample in group]
+        statements = [sample.statements for sample in group if sample.statements is not None]
+        db_times = [sample.db_seconds * 1000 for sample in group if sample.db_seconds is not None]
+        return {
+            "requests": len(group),
+            "errors": sum(1 for sample in group if sample.status >= 400),
+            "throughput": len(group) / elapsed if elapsed else 0.0,
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+            "statements": statistics.fmean(statements) if statements else None,
+            "db_ms": statistics.fmean(db_times) if db_times else None,
+        }
+
+    endpoints = {}
+    for sample in samples:
+        endpoints.setdefault(sample.endpoint, []).append(sample)
+    return {
+        "elapsed_seconds": elapsed,
+        "overall": stats(samples),
+        "endpoints": {endpoint: stats(group) for endpoint, group in sorted(endpoints.items())},
+    }
+
+
+def format_table(summary: dict) -> str:
+    header = f"{'endpoint':<28} {'reqs':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'stmts':>6} {'db ms':>7}"
+    lines = [header, "-" * len(header)]
+    rows = list(summary["endpoints"].items()) + [("overall", summary["overall"])]
+    for endpoint, stats in rows:
+        statements = "-" if stats["statements"] is None else f"{stats['statements']:.1f}"
+        db_ms = "-" if stats["db_ms"] is None else f"{stats['db_ms']:.2f}"
+        lines.append(
+            f"{endpoint:<28} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput']:>8.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {statements:>6} {db_ms:>7}"
+        )
+    return "\n".join(lines)
+
+
+def compare(summary: dict, baseline: dict, tolerance: float, statement_tolerance: float = 0.1) -> List[str]:
+    """
+    Regressions of `summary` against `baseline`: an endpoint whose p95 grew by
+    more than `tolerance` (0.2 = 20%), or whose mean statements per request
+    grew by more than `statement_tolerance`. Statement counts don't depend on
+    the machine; the small allowance covers cache refreshes (e.g. the
+    catalog version re-check) landing on different requests.
+    """
+    regressions = []
+    for endpoint, before in baseline["endpoints"].items():
+        after = summary["endpoints"].get(endpoint)
+        if after is None:
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {before['p95_ms']:.2f} ms -> {after['p95_ms']:.2f} ms")
+        if before["statements"] is not None and after["statements"] is not None:
+            if after["statements"] > before["statements"] * (1 + statement_tolerance) + 0.05:
+                regressions.append(f"{endpoint}: {before['statements']:.2f} -> {after['statements']:.2f} statements per request")
+    return regressions
+
+
+def load_baseline(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, summary: dict, meta: dict):
+    with open(path, "w") as f:
+        json.dump({**meta, **summary}, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of response rendering for a large list of firearms.
+
+    python -m benchmarks.serialization --items 500 --repeat 50
+
+Compares FastAPI's default path (validate against the response model, dump
+to a dict, `jsonable_encoder`, stdlib `json`), the same dict encoded by
+orjson (the app's default response class), and `app.serialization.render`,
+which goes from ORM-like objects to bytes inside pydantic-core.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from types import SimpleNamespace
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app import schemas
+from app.serialization import render
+
+
+def synthetic_firearms(count: int, seed: int = 0):
+    """ORM-shaped objects (attribute access only) like the ones handlers return."""
+    rng = random.Random(seed)
+    wars = [SimpleNamespace(war_id=i, name=f"War {i}") for i in range(40)]
+    cartridges = [SimpleNamespace(cartridge_id=i, name=f"{rng.randint(5, 15)}x{rng.randint(20, 80)}mm #{i}") for i in range(60)]
+    return [
+        SimpleNamespace(
+            firearm_id=i,
+            name=f"Firearm {i}",
+            designer=f"Designer {rng.randint(1, 300)}",
+            designed=str(rng.randint(1860, 2020)),
+            produced=f"{rng.randint(1860, 2000)}–present",
+            action=rng.choice(["Bolt action", "Gas-operated, rotating bolt", "Blowback", "Lever action"]),
+            wars=rng.sample(wars, rng.randint(0, 6)),
+            cartridges=rng.sample(cartridges, rng.randint(1, 3)),
+        )
+        for i in range(count)
+    ]
+
+
+def fastapi_default(adapter, items):
+    value = adapter.validate_python(items, from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(value, mode="json"))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def orjson_dict(adapter, items):
+    value = adapter.validate_python(items, from_attributes=True)
+    return orjson.dumps(adapter.dump_python(value, mode="json"))
+
+
+def direct(adapter, items):
+    return render(List[schemas.Firearm], items).body
+
+
+def timed(fn, adapter, items, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(adapter, items)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    items = synthetic_firearms(args.items)
+    adapter = TypeAdapter(List[schemas.Firearm])
+    direct(adapter, items)  # build the cached adapter outside the timing
+
+    baseline = None
+    print(f"{args.items} firearms, median of {args.repeat}")
+    for label, fn in [("fastapi default (json)", fastapi_default), ("dict + orjson", orjson_dict), ("render (dump_json)", direct)]:
+        seconds, size = timed(fn, adapter, items, args.repeat)
+        baseline = baseline or seconds
+        print(f"  {label:<24}{seconds * 1000:9.2f} ms  {baseline / seconds:5.1f}x  {size / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
+import os
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+# Code that opens its own sessions (e.g. streaming exports) uses the app's
+# engine rather than get_db, so point that at the test database too.
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+os.environ.setdefault("DB_POOL_MODE", "null")
+
 from app.main import app
-from app.database import Base, get_db
+from app import auth, cache, observability, rate_limit, response_cache, revocation
+from app.database import Base, get_db, shared_session
 from app.models import User
 from app.auth import get_password_hash
 
@@ -15,6 +24,13 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The app runs on AsyncSession. TestClient may drive each request on a new
+# event loop, so don't keep connections around between them.
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+# Instrumented like the app's own engines (app/database.py)
+observability.attach(async_engine.sync_engine)
+
 # Create the database tables before tests run
 Base.metadata.create_all(bind=engine)
 
@@ -26,6 +42,10 @@ def db():
     """
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    cache.invalidate_catalog()
+    auth.principal_cache.clear()
+    revocation.forget()
+    rate_limit.store.clear()
     db = TestingSessionLocal()
     try:
         yield db
@@ -38,12 +58,14 @@ def client(db):
     """
     Fixture to provide a TestClient instance that uses the test database.
     """
-    def override_get_db():
-        try:
-            db = TestingSessionLocal()
+    async def override_get_db():
+        # Honour POST /batch's shared session like get_db does
+        shared = shared_session.get()
+        if shared is not None:
+            yield shared
+            return
+        async with TestingAsyncSessionLocal() as db:
             yield db
-        finally:
-            db.close()
 
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
@@ -73,4 +95,46 @@ def auth_token(client, test_user):
         data={"username": test_user["email"], "password": test_user["password"]},
     )
     assert response.status_code == 200
-    return response.json()["access_token"]
\ No newline at end of file
+    return response.json()["access_token"]
+
+@pytest.fixture
+def admin_token(client, db):
+    """Fixture to get an authentication token for an admin user."""
+    db.add(User(
+        email="admin@example.com",
+        hashed_password=get_password_hash("adminpassword"),
+        is_admin=True,
+    ))
+    db.commit()
+    response = client.post(
+        "/api/v1/token",
+        data={"username": "admin@example.com", "password": "adminpassword"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def statements(client):
+    """
+    Fixture returning `run(url, **kwargs)`: GET `url` and return the SQL statements the
+    app ran for it. Caches are reset and warmed by an unrecorded request
+    first, so only the statements the endpoint itself needs are recorded.
+    """
+    def run(url, **kwargs):
+        cache.invalidate_catalog()
+        assert client.get(url, **kwargs).status_code == 200
+        # Measure the endpoint, not a response cache hit
+        response_cache.response_cache.clear()
+        executed = []
+
+        def record(conn, cursor, statement, *args):
+            executed.append(statement)
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            assert client.get(url, **kwargs).status_code == 200
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+        return executed
+    return run
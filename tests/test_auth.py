@@ -1,3 +1,6 @@
+from app import revocation
+from app.models import TokenRevocation, User
+
 def test_register_user(client, db):
     """
     Test user registration successfully.
@@ -56,3 +59,56 @@ def test_login_wrong_email(client, test_user):
     )
     assert response.status_code == 401
     assert response.json()["detail"] == "Incorrect email or password"
+
+def test_token_claims_and_revocation(client, test_user, auth_token, admin_token, statements):
+    """
+    Tokens carry the role and token version; once verified, a token needs no
+    database round trip, and revoking bumps the version so it stops working.
+    """
+    from jose import jwt
+    claims = jwt.get_unverified_claims(auth_token)
+    assert claims["sub"] == test_user["email"]
+    assert claims["admin"] is False
+    assert claims["ver"] == 0
+
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    assert statements("/api/v1/me", headers=headers) == []
+    me = client.get("/api/v1/me", headers=headers).json()
+    assert me["email"] == test_user["email"]
+    assert me["is_admin"] is False
+
+    # Only admins may revoke
+    response = client.post(f"/api/v1/admin/users/{me['id']}/revoke-tokens", headers=headers)
+    assert response.status_code == 403
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.post(f"/api/v1/admin/users/{me['id']}/revoke-tokens", headers=admin_headers)
+    assert response.status_code == 204
+    assert client.post("/api/v1/admin/users/999/revoke-tokens", headers=admin_headers).status_code == 404
+
+    assert client.get("/api/v1/me", headers=headers).status_code == 401
+    response = client.post(
+        "/api/v1/token",
+        data={"username": test_user["email"], "password": test_user["password"]},
+    )
+    new_token = response.json()["access_token"]
+    assert jwt.get_unverified_claims(new_token)["ver"] == 1
+    assert client.get("/api/v1/me", headers={"Authorization": f"Bearer {new_token}"}).status_code == 200
+
+
+def test_revocation_from_another_container(client, db, admin_token):
+    """
+    A revocation made elsewhere (e.g. by another container) bumps the shared
+    epoch; cached tokens are re-verified once this container re-reads it.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    assert client.get("/api/v1/admin/cache", headers=headers).status_code == 200
+
+    db.query(User).filter(User.email == "admin@example.com").update({"token_version": 1})
+    db.add(TokenRevocation(id=1, epoch=1))
+    db.commit()
+    # Within REVOCATION_CHECK_TTL the cached token is still trusted
+    assert client.get("/api/v1/admin/cache", headers=headers).status_code == 200
+
+    revocation.forget()
+    assert client.get("/api/v1/admin/cache", headers=headers).status_code == 401
+    assert client.get("/api/v1/me", headers=headers).status_code == 401
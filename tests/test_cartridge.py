@@ -1,3 +1,5 @@
+from app.models import Cartridge
+
 def test_get_cartridges_empty(client):
     """
     Test getting cartridges from an empty database.
@@ -15,3 +17,20 @@ def test_get_cartridge_not_found(client):
     response = client.get("/api/v1/cartridge/999")
     assert response.status_code == 404
     assert response.json()["detail"] == "Cartridge not found"
+
+def test_get_cartridges_without_total(client, db):
+    """
+    Test that include_total=false skips the count but still reports has_more.
+    """
+    db.add_all([Cartridge(name=name) for name in [".303 British", "7.62x54mmR", "8mm Mauser"]])
+    db.commit()
+
+    response = client.get("/api/v1/cartridge/?limit=2&include_total=false")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["items"]) == 2
+    assert data["total"] is None
+    assert data["has_more"] is True
+
+    response = client.get("/api/v1/cartridge/?limit=2&offset=2&include_total=false")
+    assert response.json()["has_more"] is False
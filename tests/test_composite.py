@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import event, text
+
+from app import composite, documents
+from app.models import Firearm, War
+from tests.conftest import async_engine
+
+
+def test_composite_batch(client, db, admin_token):
+    """
+    POST /batch runs its GETs on one connection and returns each sub-response
+    in order with its own status; oversized batches are rejected up front.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}", "Content-Type": "application/x-ndjson"}
+    client.post("/api/v1/firearm/bulk", content='{"name": "AK-47", "wars": ["Vietnam War"], "cartridges": ["7.62x39mm"]}', headers=headers)
+    firearm_id = client.get("/api/v1/firearm/").json()["items"][0]["firearm_id"]
+
+    connections = []
+
+    def record(*args):
+        connections.append(args)
+
+    event.listen(async_engine.sync_engine, "connect", record)
+    try:
+        response = client.post("/api/v1/batch", json={"requests": [
+            {"id": "firearm", "path": f"/api/v1/firearm/{firearm_id}"},
+            {"id": "wars", "path": f"/api/v1/firearm/{firearm_id}/wars"},
+            {"path": "/api/v1/cartridge/search?name=7.62"},
+            {"path": "/api/v1/war/999"},
+            {"path": "/api/v1/type/?limit=5"},
+        ]})
+    finally:
+        event.remove(async_engine.sync_engine, "connect", record)
+    assert response.status_code == 200
+    assert len(connections) == 1
+    responses = response.json()["responses"]
+    assert [r["id"] for r in responses] == ["firearm", "wars", "2", "3", "4"]
+    assert [r["status"] for r in responses] == [200, 200, 200, 404, 200]
+    assert responses[0]["body"]["name"] == "AK-47"
+    assert responses[1]["body"]["items"] == [{"war_id": 1, "name": "Vietnam War"}]
+    assert responses[2]["body"]["items"][0]["name"] == "7.62x39mm"
+    assert "etag" in responses[4]["headers"]
+
+    too_many = [{"path": "/api/v1/type/"}] * 21
+    assert client.post("/api/v1/batch", json={"requests": too_many}).status_code == 400
+    too_costly = [{"path": "/api/v1/firearm/search?name=AK"}] * 9
+    assert client.post("/api/v1/batch", json={"requests": too_costly}).status_code == 400
+    assert client.post("/api/v1/batch", json={"requests": [{"path": "/api/v1/firearm/export"}]}).status_code == 400
+    assert client.post("/api/v1/batch", json={"requests": [{"method": "POST", "path": "/api/v1/firearm/"}]}).status_code == 422
+
+
+@pytest.mark.parametrize("rollback", [False, True])
+def test_composite_batch_isolates_failures(client, db, monkeypatch, rollback):
+    """A sub-request whose statement fails gets a 500; its siblings, before and after it, still succeed."""
+    if rollback:
+        # As on PostgreSQL, where a failed statement aborts the shared transaction
+        monkeypatch.setattr(composite, "ROLLBACK_DIALECTS", {"postgresql", "sqlite"})
+    db.add_all([Firearm(name="AK-47"), War(name="Vietnam War")])
+    db.commit()
+
+    async def broken_read(db, ids):
+        await db.execute(text("SELECT * FROM no_such_table"))
+
+    monkeypatch.setattr(documents, "read", broken_read)
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.post("/api/v1/batch", json={"requests": [
+            {"path": "/api/v1/war/search/?query=vietnam"},
+            {"path": "/api/v1/firearm/1"},
+            {"path": "/api/v1/firearm/1/wars"},
+            {"path": "/api/v1/firearm/search?name=AK"},
+        ]})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["responses"]] == [200, 500, 200, 200]
+    # GET sub-requests run their statements without savepoints
+    assert not any(statement.startswith("SAVEPOINT") for statement in executed)
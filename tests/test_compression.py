@@ -0,0 +1,99 @@
+import asyncio
+import base64
+import gzip
+import json
+
+from app import compression, main, observability
+from app.models import Firearm, War
+
+
+def test_response_compression(client, db, monkeypatch):
+    """
+    Large responses are gzipped for clients that accept it, cacheable ones are
+    compressed once per catalog version, and the Lambda handler returns them
+    base64 encoded.
+    """
+    war = War(name="Winter War")
+    db.add_all([Firearm(name=f"Suomi KP/-31 series {i}", designer="Aimo Lahti", wars=[war]) for i in range(30)])
+    db.commit()
+    compression.compressed_cache.clear()
+    monkeypatch.setattr(compression, "_encodings", None)
+    url = f"/api/v1/war/{war.war_id}/firearms"
+
+    # Encoders are only loaded for the first response that gets compressed
+    assert "content-encoding" not in client.get("/", headers={"Accept-Encoding": "gzip"}).headers
+    assert compression._encodings is None
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compression._encodings is not None
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert len(response.json()["items"]) == 30
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+
+    hits = compression.compressed_cache.hits
+    assert client.get(url, headers={"Accept-Encoding": "gzip"}).content == response.content
+    assert compression.compressed_cache.hits == hits + 1
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+
+    assert "content-encoding" not in client.get(url, headers={"Accept-Encoding": "identity"}).headers
+
+    monkeypatch.setattr(observability, "emit_emf", False)
+    result = invoke_handler(url, {"Accept-Encoding": "gzip"})
+    assert result["statusCode"] == 200
+    assert result["isBase64Encoded"] is True
+    assert len(json.loads(gzip.decompress(base64.b64decode(result["body"])))["items"]) == 30
+
+
+def invoke_handler(url: str, headers: dict) -> dict:
+    """Run an API Gateway proxy event for `GET url` through the Lambda handler."""
+    headers = {"Host": "localhost", **headers}
+    path, _, query = url.partition("?")
+    params = dict(param.split("=", 1) for param in query.split("&")) if query else None
+    event = {
+        "resource": "/{proxy+}", "path": path, "httpMethod": "GET",
+        "headers": headers, "multiValueHeaders": {name: [value] for name, value in headers.items()},
+        "queryStringParameters": params,
+        "multiValueQueryStringParameters": {name: [value] for name, value in params.items()} if params else None,
+        "requestContext": {"resourcePath": "/{proxy+}", "httpMethod": "GET", "path": f"/Prod{path}", "stage": "Prod",
+                           "identity": {"sourceIp": "127.0.0.1"}},
+        "pathParameters": None, "stageVariables": None, "body": None, "isBase64Encoded": False,
+    }
+    # Mangum runs on the thread's event loop, as on Lambda
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return main.handler(event, None)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_handler_base64_only_for_compressed_bodies(client, db, monkeypatch):
+    """Only compressed responses leave the Lambda handler base64 encoded; JSON and NDJSON stay text."""
+    db.add_all([Firearm(name=f"Lahti-Saloranta M/26 series {i}", designer="Aimo Lahti") for i in range(30)])
+    db.commit()
+    monkeypatch.setattr(observability, "emit_emf", False)
+
+    compressed = invoke_handler("/api/v1/firearm/", {"Accept-Encoding": "gzip"})
+    assert compressed["headers"]["content-encoding"] == "gzip"
+    assert compressed["isBase64Encoded"] is True
+
+    plain = invoke_handler("/api/v1/firearm/", {})
+    assert "content-encoding" not in plain["headers"]
+    assert plain["isBase64Encoded"] is False
+    assert len(json.loads(plain["body"])["items"]) == 30
+
+    export = invoke_handler("/api/v1/firearm/export?format=ndjson", {})
+    assert export["isBase64Encoded"] is False
+    assert len(export["body"].splitlines()) == 30
+
+    # A compressed body that happens to be valid UTF-8 still goes out base64
+    monkeypatch.setattr(main, "_mangum", lambda event, context: {
+        "statusCode": 200, "headers": {"content-type": "application/json", "content-encoding": "br"},
+        "body": "{}", "isBase64Encoded": False,
+    })
+    result = main.handler({}, None)
+    assert result["isBase64Encoded"] is True
+    assert base64.b64decode(result["body"]) == b"{}"
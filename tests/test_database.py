@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from app.database import build_engine, pool_options
+from app.pool_metrics import pool_stats
+
+
+def test_queue_pool_records_checkouts(tmp_path):
+    """
+    Test that the queue pool mode is instrumented with in-use gauges.
+    """
+    engine = build_engine(f"sqlite:///{tmp_path / 'pool.db'}", "queue")
+    assert isinstance(engine.pool, QueuePool)
+    before = pool_stats.snapshot()
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert pool_stats.snapshot()["in_use"] == before["in_use"] + 1
+    after = pool_stats.snapshot()
+    assert after["in_use"] == before["in_use"]
+    assert after["checkouts"] == before["checkouts"] + 1
+    engine.dispose()
+
+def test_unknown_pool_mode():
+    """
+    Test that an unknown pool mode is rejected.
+    """
+    with pytest.raises(ValueError):
+        pool_options("bogus")
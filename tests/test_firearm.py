@@ -1,3 +1,9 @@
+import json
+from app import cli
+from app.config import settings
+from app.pagination import encode_cursor
+from app.models import Firearm, FirearmDocument, War, Cartridge, Manufacturer, Variant
+
 
 def test_get_firearms_empty(client):
     """
@@ -24,3 +30,338 @@ def test_search_firearms_not_found(client):
     response = client.get("/api/v1/firearm/search?name=nonexistent")
     assert response.status_code == 404
     assert response.json()["detail"] == "No firearms found matching the search criteria"
+
+def test_create_firearm_changes_etag(client, admin_token):
+    """
+    Test that an admin write bumps the catalog version behind ETags.
+    """
+    etag = client.get("/api/v1/firearm/").headers["etag"]
+
+    response = client.post(
+        "/api/v1/firearm/",
+        json={"name": "Mosin-Nagant"},
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert response.status_code == 201
+
+    response = client.get("/api/v1/firearm/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["total"] == 1
+
+def test_update_firearm(client, admin_token):
+    """
+    Test updating a firearm as an admin.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    firearm_id = client.post("/api/v1/firearm/", json={"name": "AK-47"}, headers=headers).json()["firearm_id"]
+
+    response = client.put(f"/api/v1/firearm/{firearm_id}", json={"designer": "Mikhail Kalashnikov"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["designer"] == "Mikhail Kalashnikov"
+    assert response.json()["wars"] == []
+
+    assert client.delete(f"/api/v1/firearm/{firearm_id}", headers=headers).status_code == 204
+    assert client.get(f"/api/v1/firearm/{firearm_id}").status_code == 404
+
+def test_get_firearms_serializes_relationships(client, db):
+    """
+    Test that list pages render each firearm with its wars and cartridges.
+    """
+    db.add(Firearm(name="Lee-Enfield", wars=[War(name="World War I")], cartridges=[Cartridge(name=".303 British")]))
+    db.commit()
+
+    response = client.get("/api/v1/firearm/")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    [item] = response.json()["items"]
+    assert item["wars"][0]["name"] == "World War I"
+    assert item["cartridges"][0]["name"] == ".303 British"
+
+def test_bulk_import_ndjson(client, admin_token):
+    """
+    Test a streamed NDJSON import with relationships and a bad row.
+    """
+    body = "\n".join([
+        '{"name": "PPSh-41", "designer": "Georgy Shpagin", "wars": ["World War II", "Korean War"], "cartridges": ["7.62x25mm Tokarev"]}',
+        '{"designer": "no name"}',
+        'not json',
+        '{"name": "PPS-43", "wars": ["World War II"], "cartridges": ["7.62x25mm Tokarev"]}',
+    ])
+    response = client.post(
+        "/api/v1/firearm/bulk",
+        content=body,
+        headers={"Authorization": f"Bearer {admin_token}", "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["rows"] == 4
+    assert result["imported"] == 2
+    assert [e["line"] for e in result["errors"]] == [2, 3]
+
+    wars = client.get("/api/v1/war/").json()["items"]
+    assert sorted(w["name"] for w in wars) == ["Korean War", "World War II"]
+    ww2 = next(w for w in wars if w["name"] == "World War II")
+    names = [f["name"] for f in client.get(f"/api/v1/war/{ww2['war_id']}/firearms").json()["items"]]
+    assert sorted(names) == ["PPS-43", "PPSh-41"]
+
+def test_bulk_import_csv_upserts(client, admin_token):
+    """
+    Test that a CSV import upserts by name and keeps values left blank.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}", "Content-Type": "text/csv"}
+    client.post("/api/v1/firearm/bulk", content="name,designer,cartridges\nSKS,Sergei Simonov,7.62x39mm\n", headers=headers)
+    response = client.post("/api/v1/firearm/bulk", content="name,designer,action\nSKS,,Gas-operated\n", headers=headers)
+    assert response.json()["imported"] == 1
+
+    [sks] = client.get("/api/v1/firearm/").json()["items"]
+    assert sks["designer"] == "Sergei Simonov"
+    assert sks["action"] == "Gas-operated"
+    assert [c["name"] for c in sks["cartridges"]] == ["7.62x39mm"]
+
+def test_bulk_import_malformed_records(client, admin_token):
+    """
+    Test that quoted newlines in CSV, invalid UTF-8 and non-object JSON lines are handled per record.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}", "Content-Type": "text/csv"}
+    body = 'name,designer\n"Lee-Enfield\nNo. 4",James Paris Lee\nSKS,Sergei Simonov\n'.encode() + b"\xff\xfe,x\n"
+    result = client.post("/api/v1/firearm/bulk", content=body, headers=headers).json()
+    assert result["imported"] == 2
+    assert [(e["line"], e["error"].split(":")[0]) for e in result["errors"]] == [(5, "Invalid UTF-8")]
+    names = sorted(f["name"] for f in client.get("/api/v1/firearm/").json()["items"])
+    assert names == ["Lee-Enfield\nNo. 4", "SKS"]
+
+    headers["Content-Type"] = "application/x-ndjson"
+    result = client.post("/api/v1/firearm/bulk", content=b'"str"\n{"name": "M1 Garand"}\n\xff\n', headers=headers).json()
+    assert result["imported"] == 1
+    assert [e["line"] for e in result["errors"]] == [1, 3]
+    assert result["errors"][0]["error"] != "str"
+
+def test_export_streams_catalog(client, admin_token):
+    """
+    Test the NDJSON, CSV and gzipped exports.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}", "Content-Type": "application/x-ndjson"}
+    client.post("/api/v1/firearm/bulk", content='{"name": "AK-47", "wars": ["Vietnam War", "Korean War"]}\n{"name": "M16"}', headers=headers)
+
+    response = client.get("/api/v1/firearm/export")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["name"] for r in records] == ["AK-47", "M16"]
+    assert records[0]["wars"] == ["Korean War", "Vietnam War"]
+    assert records[1]["wars"] == []
+
+    lines = client.get("/api/v1/firearm/export?format=csv").text.splitlines()
+    assert lines[0].startswith("firearm_id,name,designer")
+    assert "Korean War|Vietnam War" in lines[1]
+
+    response = client.get("/api/v1/firearm/export?gzip=true")
+    assert response.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["name"] for line in response.text.splitlines()] == ["AK-47", "M16"]
+
+def test_batch_lookup(client, admin_token):
+    """
+    Test that a batch keeps request order, reports missing ids and honours include.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}", "Content-Type": "application/x-ndjson"}
+    client.post("/api/v1/firearm/bulk", content='{"name": "AK-47", "types": ["Assault rifle"], "wars": ["Vietnam War"]}\n{"name": "M16"}', headers=headers)
+    ids = {f["name"]: f["firearm_id"] for f in client.get("/api/v1/firearm/").json()["items"]}
+
+    response = client.get(f"/api/v1/firearm/batch?ids={ids['M16']},999,{ids['AK-47']}&include=types,wars")
+    assert response.status_code == 200
+    body = response.json()
+    assert [f["name"] for f in body["items"]] == ["M16", "AK-47"]
+    assert body["missing"] == [999]
+    assert body["items"][1]["types"] == [{"type_id": 1, "name": "Assault rifle"}]
+    assert body["items"][1]["cartridges"] is None
+
+    assert client.get("/api/v1/firearm/batch?ids=1&include=bogus").status_code == 400
+    assert client.get("/api/v1/firearm/batch?ids=a,b").status_code == 400
+
+def test_statement_count_does_not_grow_with_rows(db, statements):
+    """
+    Test that firearm endpoints run a fixed number of statements however many rows they return.
+    """
+    war = War(name="World War II")
+    cartridge = Cartridge(name="7.92x57mm Mauser")
+
+    def add_firearms(n):
+        start = db.query(Firearm).count()
+        db.add_all([Firearm(name=f"Rifle {start + i}", wars=[war], cartridges=[cartridge]) for i in range(n)])
+        db.commit()
+
+    urls = {
+        "/api/v1/firearm/": 3,
+        "/api/v1/firearm/?include=types,wars,cartridges,manufacturers": 5,
+        "/api/v1/firearm/1?include=wars,cartridges": 3,
+        "/api/v1/war/1/firearms": 3,
+        "/api/v1/cartridge/1/firearms?include=wars": 2,
+        "/api/v1/war/1/firearms/names": 1,
+        "/api/v1/firearm/1/wars": 1,
+    }
+    add_firearms(2)
+    few = {url: len(statements(url)) for url in urls}
+    add_firearms(40)
+    many = {url: len(statements(url)) for url in urls}
+    assert few == many == urls
+
+def test_sparse_fieldsets(db, client, statements):
+    """
+    Test that fields= narrows the response and the SQL behind it.
+    """
+    db.add(Firearm(name="Kar98k", designer="Mauser", wars=[War(name="World War II")]))
+    db.commit()
+
+    [item] = client.get("/api/v1/firearm/?fields=name").json()["items"]
+    assert item == {"firearm_id": 1, "name": "Kar98k"}
+    assert client.get("/api/v1/firearm/1?fields=name,wars").json() == {
+        "firearm_id": 1, "name": "Kar98k", "wars": [{"war_id": 1, "name": "World War II"}],
+    }
+    assert client.get("/api/v1/firearm/?fields=bogus").status_code == 400
+
+    [select_page] = statements("/api/v1/firearm/?fields=name")
+    assert "designer" not in select_page
+
+def test_relationship_routes(client, db):
+    """
+    Test both directions of the junction-table routes, including paging and 404s.
+    """
+    acme = Manufacturer(name="Acme")
+    db.add_all([Firearm(name=f"Model {i}", manufacturers=[acme], variants=[Variant(name=f"Model {i}A")]) for i in range(3)])
+    db.commit()
+
+    page = client.get("/api/v1/manufacturer/1/firearms/names?limit=2").json()
+    assert page["items"] == [{"firearm_id": 1, "name": "Model 0"}, {"firearm_id": 2, "name": "Model 1"}]
+    page = client.get(f"/api/v1/manufacturer/1/firearms/names?cursor={page['next_cursor']}").json()
+    assert page["items"] == [{"firearm_id": 3, "name": "Model 2"}]
+
+    assert client.get("/api/v1/firearm/2/manufacturers").json()["items"] == [{"manufacturer_id": 1, "name": "Acme"}]
+    [variant] = client.get("/api/v1/firearm/2/variants").json()["items"]
+    assert variant["name"] == "Model 1A"
+    assert [f["name"] for f in client.get(f"/api/v1/variant/{variant['variant_id']}/firearms").json()["items"]] == ["Model 1"]
+    assert client.get("/api/v1/firearm/2/wars").json()["items"] == []
+
+    assert client.get("/api/v1/firearm/99/wars").status_code == 404
+    assert client.get("/api/v1/cartridge/99/firearms/names").status_code == 404
+
+def test_filter_with_facets(client, db, statements):
+    """
+    Test faceted filtering across junction tables and the per-facet counts.
+    """
+    ww2, korea = War(name="World War II"), War(name="Korean War")
+    rimmed = Cartridge(name="7.62x54mmR")
+    db.add_all([
+        Firearm(name="Mosin-Nagant", wars=[ww2, korea], cartridges=[rimmed]),
+        Firearm(name="SVT-40", wars=[ww2], cartridges=[rimmed]),
+        Firearm(name="PPSh-41", wars=[ww2, korea]),
+        Firearm(name="Dragunov", cartridges=[rimmed]),
+    ])
+    db.commit()
+
+    body = client.get(f"/api/v1/firearm/filter?war_id={ww2.war_id}&cartridge_id={rimmed.cartridge_id}").json()
+    assert [f["name"] for f in body["items"]] == ["Mosin-Nagant", "SVT-40"]
+    assert body["total"] == 2
+    assert body["facets"]["wars"] == [
+        {"id": ww2.war_id, "name": "World War II", "count": 2},
+        {"id": korea.war_id, "name": "Korean War", "count": 1},
+    ]
+    assert body["facets"]["types"] == []
+
+    body = client.get(f"/api/v1/firearm/filter?war_id={ww2.war_id},{korea.war_id}&facet=cartridges&limit=2").json()
+    assert body["has_more"] and body["total"] == 3
+    assert list(body["facets"]) == ["cartridges"]
+    body = client.get(f"/api/v1/firearm/filter?war_id={ww2.war_id},{korea.war_id}&cursor={body['next_cursor']}").json()
+    assert [f["name"] for f in body["items"]] == ["PPSh-41"]
+
+    # Page ids, total and facets in one statement, then the page's firearms and their wars and cartridges
+    assert len(statements(f"/api/v1/firearm/filter?war_id={ww2.war_id}")) == 4
+
+def test_snapshot_mode_matches_database(client, db, admin_token, statements, monkeypatch, tmp_path):
+    """
+    Test that snapshot mode serves the same responses as the database, without SQL, and reloads on writes.
+    """
+    ww2, korea = War(name="World War II"), War(name="Korean War")
+    db.add_all([
+        Firearm(name="M1 Garand", designer="John Garand", wars=[ww2, korea], cartridges=[Cartridge(name=".30-06")]),
+        Firearm(name="Thompson", wars=[ww2], manufacturers=[Manufacturer(name="Auto-Ordnance")]),
+        Firearm(name="AK-47"),
+    ])
+    db.commit()
+    urls = [
+        "/api/v1/firearm/?limit=2",
+        "/api/v1/firearm/?include=wars,manufacturers&fields=name",
+        "/api/v1/firearm/1",
+        "/api/v1/firearm/batch?ids=3,9,1&include=types",
+        f"/api/v1/firearm/filter?war_id={ww2.war_id},{korea.war_id}&limit=1",
+        f"/api/v1/war/{ww2.war_id}/firearms",
+        f"/api/v1/war/{korea.war_id}/firearms/names",
+        "/api/v1/firearm/1/wars",
+    ]
+    from_db = [client.get(url).json() for url in urls]
+
+    monkeypatch.setattr(settings, "SNAPSHOT_MODE", True)
+    monkeypatch.setattr(settings, "SNAPSHOT_PATH", str(tmp_path / "snapshot.json"))
+    assert [client.get(url).json() for url in urls] == from_db
+    assert client.get("/api/v1/firearm/99").status_code == 404
+    assert statements("/api/v1/firearm/filter?war_id=1") == []
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.put("/api/v1/firearm/3", json={"designer": "Mikhail Kalashnikov"}, headers=headers)
+    assert client.get("/api/v1/firearm/3").json()["designer"] == "Mikhail Kalashnikov"
+
+def test_firearm_documents(client, db, admin_token, statements):
+    """
+    Test that admin writes maintain the stored documents the detail and batch endpoints serve.
+    """
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/api/v1/firearm/bulk", content='{"name": "FN FAL", "types": ["Battle rifle"], "wars": ["Falklands War"]}', headers=headers)
+    client.put("/api/v1/firearm/1", json={"designer": "Dieudonné Saive"}, headers=headers)
+
+    assert db.query(FirearmDocument).count() == 1
+    # One primary-key lookup on firearm_documents
+    assert len(statements("/api/v1/firearm/1")) == 1
+    document = client.get("/api/v1/firearm/1").json()
+    assert document["designer"] == "Dieudonné Saive"
+    assert document["types"] == [{"type_id": 1, "name": "Battle rifle"}]
+    assert document["variants"] == []
+
+    body = client.get("/api/v1/firearm/batch?ids=2,1").json()
+    assert body == {"items": [document], "missing": [2]}
+
+    client.delete("/api/v1/firearm/1", headers=headers)
+    db.expire_all()
+    assert db.query(FirearmDocument).count() == 0
+
+def test_rebuild_documents_command(db, capsys):
+    """
+    Test the CLI command that rebuilds firearm documents from scratch.
+    """
+    db.add_all([Firearm(name="Bren", wars=[War(name="World War II")]), Firearm(name="Sten")])
+    db.commit()
+
+    cli.main(["rebuild-documents", "--chunk-size", "1"])
+
+    assert "Rebuilt 2 firearm documents" in capsys.readouterr().out
+    documents = {d.firearm_id: d.document for d in db.query(FirearmDocument)}
+    assert documents[1]["wars"] == [{"war_id": 1, "name": "World War II"}]
+    assert documents[2]["name"] == "Sten"
+
+def test_cursor_values_are_type_checked(client, db):
+    """
+    Test that cursors whose values don't match the sort keys' types, and non-positive limits, don't reach the query.
+    """
+    db.add_all([Firearm(name="AK-47"), Firearm(name="M16"), War(name="Korean War")])
+    db.commit()
+
+    for url in ["/api/v1/firearm/", "/api/v1/firearm/filter", "/api/v1/war/1/firearms"]:
+        response = client.get(f"{url}?cursor={encode_cursor(['x'])}")
+        assert response.status_code == 400, url
+        assert response.json()["detail"] == "Invalid cursor"
+    assert client.get(f"/api/v1/firearm/search?name=a&cursor={encode_cursor([1, 'AK-47'])}").status_code == 400
+    assert client.get(f"/api/v1/firearm/search?name=a&cursor={encode_cursor(['AK-47', 1])}").status_code == 200
+
+    for limit in (0, -1):
+        page = client.get(f"/api/v1/firearm/?limit={limit}").json()
+        assert page["limit"] == 1
+        assert [f["name"] for f in page["items"]] == ["AK-47"]
+        assert page["has_more"] is True and page["next_cursor"] is not None
@@ -1,10 +1,15 @@
+from app import cache
+from app.models import Manufacturer
+
 def test_get_manufacturers_empty(client):
     """
     Test getting manufacturers from an empty database.
     """
     response = client.get("/api/v1/manufacturer/")
     assert response.status_code == 200
-    assert response.json() == []
+    data = response.json()
+    assert data["items"] == []
+    assert data["total"] == 0
 
 def test_get_manufacturer_not_found(client):
     """
@@ -13,3 +18,17 @@ def test_get_manufacturer_not_found(client):
     response = client.get("/api/v1/manufacturer/999")
     assert response.status_code == 404
     assert response.json()["detail"] == "Manufacturer not found"
+
+def test_get_manufacturer_served_from_cache(client, db):
+    """
+    Test that manufacturer lookups are cached and counted.
+    """
+    db.add(Manufacturer(name="Izhevsk Mechanical Plant"))
+    db.commit()
+
+    before = cache.lookup_cache.stats()
+    assert client.get("/api/v1/manufacturer/1").json()["name"] == "Izhevsk Mechanical Plant"
+    assert client.get("/api/v1/manufacturer/").json()["total"] == 1
+    after = cache.lookup_cache.stats()
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
@@ -0,0 +1,33 @@
+import json
+
+from app import observability
+from app.models import Firearm, War
+
+
+def test_request_metrics(client, db, monkeypatch, capsys):
+    """
+    Responses carry Server-Timing, /metrics aggregates per route template,
+    and under the Lambda handler each request is logged in EMF.
+    """
+    war = War(name="Winter War")
+    db.add(Firearm(name="Suomi KP/-31", wars=[war]))
+    db.commit()
+    observability.route_stats.reset()
+
+    monkeypatch.setattr(observability, "emit_emf", True)
+    response = client.get(f"/api/v1/war/{war.war_id}/firearms")
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert "db;dur=" in timing and "serialize;dur=" in timing and "total;dur=" in timing
+    assert " 0 statements" not in timing
+
+    [line] = [line for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+    emf = json.loads(line)
+    assert emf["Route"] == "GET /api/v1/war/{war_id}/firearms"
+    assert emf["Statements"] > 0
+    assert emf["ResponseBytes"] == len(response.content)
+    assert {metric["Name"] for metric in emf["_aws"]["CloudWatchMetrics"][0]["Metrics"]} >= {"DBTime", "PoolWait", "SerializeTime"}
+
+    metrics = client.get("/metrics").text
+    assert 'firearmdb_db_statements_total{method="GET",route="/api/v1/war/{war_id}/firearms",status="200"}' in metrics
+    assert 'firearmdb_request_duration_seconds_count{method="GET",route="/api/v1/war/{war_id}/firearms",status="200"} 1' in metrics
@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import os
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app import rate_limit
+from app.config import settings
+from app.models import War
+from tests.conftest import async_engine
+
+
+class ReplyError(Exception):
+    pass
+
+
+async def read_command(reader: asyncio.StreamReader):
+    """Read one RESP value; commands arrive as arrays of bulk strings."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Client closed the connection")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"$":
+        return (await reader.readexactly(int(body) + 2))[:-2]
+    if kind == b"*":
+        return [await read_command(reader) for _ in range(int(body))]
+    raise ConnectionError(f"Unexpected input {line!r}")
+
+
+class RedisStandIn:
+    """
+    A local server speaking enough of the Redis protocol for `RedisStore`:
+    connection setup, SCRIPT LOAD and EVALSHA of the bucket script, run
+    with `refill`.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.commands = []
+        self.scripts = set()
+        self.tasks = set()
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.serve, "127.0.0.1", 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, command):
+        name = command[0].decode().upper()
+        self.commands.append(name)
+        if name == "SCRIPT":
+            sha = hashlib.sha1(command[2]).hexdigest()
+            self.scripts.add(sha)
+            return sha.encode()
+        if name != "EVALSHA":
+            # CLIENT SETINFO, SELECT and the like
+            return "OK"
+        if command[1].decode() not in self.scripts:
+            return ReplyError("NOSCRIPT No matching script. Please use EVAL.")
+        key = command[3].decode()
+        rate, burst, now, cost = (float(arg) for arg in command[4:8])
+        tokens, at = self.buckets.get(key, (None, None))
+        allowed, tokens = rate_limit.refill(tokens, at, now, rate_limit.Budget(rate, burst), cost)
+        self.buckets[key] = (tokens, now)
+        return [int(allowed), repr(tokens).encode()]
+
+    @staticmethod
+    def encode(reply) -> bytes:
+        if isinstance(reply, ReplyError):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, str):
+            return b"+%s\r\n" % reply.encode()
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(RedisStandIn.encode(item) for item in reply)
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+    async def serve(self, reader, writer):
+        self.tasks.add(asyncio.current_task())
+        try:
+            while True:
+                command = await read_command(reader)
+                writer.write(self.encode(self.run(command)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        async def shutdown():
+            self.server.close()
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+@pytest.fixture
+def small_budgets(db, monkeypatch):
+    db.add(War(name="World War II"))
+    db.commit()
+    monkeypatch.setattr(settings, "RATE_LIMIT_SEARCH_PER_SECOND", 0.01)
+    monkeypatch.setattr(settings, "RATE_LIMIT_SEARCH_BURST", 2)
+
+
+def test_search_rejected_before_database(client, small_budgets, monkeypatch):
+    """
+    Searches beyond the budget get 429 without a single SQL statement, while
+    other kinds of requests keep their own budget.
+    """
+    for _ in range(2):
+        assert client.get("/api/v1/war/search/?query=war").status_code == 200
+
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/api/v1/firearm/search?name=a")
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert executed == []
+
+    assert client.get("/api/v1/war/").status_code == 200
+    # A client with a known API key has a budget of its own
+    monkeypatch.setattr(settings, "RATE_LIMIT_API_KEYS", "partner, other")
+    assert client.get("/api/v1/war/search/?query=war", headers={"X-Api-Key": "partner"}).status_code == 200
+
+
+def test_unknown_api_key_charged_to_ip(client, small_budgets, monkeypatch):
+    """Made-up API keys neither get the larger budget nor a fresh bucket each."""
+    monkeypatch.setattr(settings, "RATE_LIMIT_API_KEYS", "partner")
+    statuses = [
+        client.get("/api/v1/war/search/?query=war", headers={"X-Api-Key": f"made-up-{i}"}).status_code
+        for i in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+
+    # A key API Gateway validated is charged to that key
+    scope = {"headers": [(b"x-api-key", b"plan-key")], "client": ("10.0.0.1", 1234)}
+    assert rate_limit.client_key(scope) == ("ip:10.0.0.1", False)
+    scope["aws.event"] = {"requestContext": {"identity": {"apiKey": "plan-key"}}}
+    key, authenticated = rate_limit.client_key(scope)
+    assert key.startswith("key:") and authenticated
+
+
+def test_redis_store(client, small_budgets, monkeypatch):
+    """The Redis-protocol store enforces the same budgets through a stand-in server."""
+    server = RedisStandIn()
+    try:
+        monkeypatch.setattr(rate_limit, "store", rate_limit.build_store(f"redis://127.0.0.1:{server.port}/0"))
+        statuses = [client.get("/api/v1/war/search/?query=war").status_code for _ in range(3)]
+        assert statuses == [200, 200, 429]
+        # The script is loaded once, on the first NOSCRIPT
+        evals = [name for name in server.commands if name in ("EVALSHA", "SCRIPT")]
+        assert evals == ["EVALSHA", "SCRIPT", "EVALSHA", "EVALSHA", "EVALSHA"]
+        assert any(key.startswith("ratelimit:search:ip:") for key in server.buckets)
+    finally:
+        server.close()
+
+
+def test_redis_store_concurrent_requests():
+    """Concurrent takes on a fresh Redis store each get their own reply."""
+    server = RedisStandIn()
+    try:
+        store = rate_limit.build_store(f"redis://127.0.0.1:{server.port}/0")
+
+        async def burst():
+            return await asyncio.gather(*(
+                store.take(f"key-{i}", rate_limit.Budget(0.001, i + 1)) for i in range(20)
+            ))
+
+        results = asyncio.run(burst())
+        assert [allowed for allowed, _ in results] == [True] * 20
+        # Each key's reply carries its own remaining tokens (burst - 1 = i)
+        assert [round(tokens) for _, tokens in results] == list(range(20))
+        assert server.commands.count("EVALSHA") >= 20
+    finally:
+        server.close()
+
+
+@pytest.mark.skipif(not os.getenv("TEST_REDIS_URL"), reason="TEST_REDIS_URL is not set")
+def test_real_redis_store():
+    """The bucket script against a real Redis server, e.g. TEST_REDIS_URL=redis://localhost:6379/15."""
+    store = rate_limit.build_store(os.environ["TEST_REDIS_URL"])
+    key = f"ratelimit:test:{os.getpid()}"
+
+    async def takes():
+        return [await store.take(key, rate_limit.Budget(0.001, 2)) for _ in range(3)]
+
+    results = asyncio.run(takes())
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert results[1][1] < 1
+
+
+def test_build_store():
+    assert isinstance(rate_limit.build_store("memory"), rate_limit.MemoryStore)
+    for url in ("redis://localhost:6379/0", "rediss://cache.example.com:6380/0", "unix:///run/redis.sock"):
+        assert isinstance(rate_limit.build_store(url), rate_limit.RedisStore)
+    with pytest.raises(ValueError):
+        rate_limit.build_store("memcached://localhost")
@@ -0,0 +1,80 @@
+import asyncio
+
+from app import response_cache
+from app.models import Type
+from app.response_cache import CachedResponse, ResponseCache
+
+
+def test_response_cache(client, db, admin_token, tmp_path):
+    """
+    Anonymous GETs are served from the response cache until an admin write;
+    requests with Authorization bypass it. Spilled entries outlive the process's cache.
+    """
+    db.add(Type(name="Assault rifle"))
+    db.commit()
+
+    first = client.get("/api/v1/type/?limit=5&offset=0")
+    assert first.status_code == 200
+    assert "x-cache" not in first.headers
+    second = client.get("/api/v1/type/?offset=0&limit=5")
+    assert second.headers["x-cache"] == "hit"
+    assert second.content == first.content
+    assert client.get("/api/v1/type/?limit=5&offset=0", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+    authorized = client.get("/api/v1/type/?limit=5&offset=0", headers={"Authorization": f"Bearer {admin_token}"})
+    assert "x-cache" not in authorized.headers
+
+    client.get("/api/v1/firearm/")
+    assert client.get("/api/v1/firearm/").headers["x-cache"] == "hit"
+    response = client.post("/api/v1/firearm/", json={"name": "AK-47"}, headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 201
+    after_write = client.get("/api/v1/firearm/")
+    assert "x-cache" not in after_write.headers
+    assert [f["name"] for f in after_write.json()["items"]] == ["AK-47"]
+
+    async def spill_and_restart():
+        spilled = ResponseCache(1024 * 1024, str(tmp_path))
+        await spilled.put("/api/v1/type/", CachedResponse(7, 200, [(b"content-type", b"application/json")], b"[]"))
+        restarted = ResponseCache(1024 * 1024, str(tmp_path))
+        return await restarted.get("/api/v1/type/", 7), await restarted.get("/api/v1/type/", 8)
+
+    current, stale = asyncio.run(spill_and_restart())
+    assert current.body == b"[]"
+    assert stale is None
+
+
+def test_spill_files_are_read_and_written_off_the_event_loop(client, db, monkeypatch, tmp_path):
+    """With a spill directory, the middleware does its file I/O in worker threads."""
+    monkeypatch.setattr(response_cache, "response_cache", ResponseCache(1024 * 1024, str(tmp_path)))
+    calls = []
+
+    def on_event_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    for name in ("_read_spilled", "_spill"):
+        original = getattr(ResponseCache, name)
+
+        def recording(self, *args, original=original, name=name):
+            calls.append((name, on_event_loop()))
+            return original(self, *args)
+
+        monkeypatch.setattr(ResponseCache, name, recording)
+
+    assert "x-cache" not in client.get("/api/v1/type/").headers
+    # A new container's cache, same spill directory
+    response_cache.response_cache._entries.clear()
+    assert client.get("/api/v1/type/").headers["x-cache"] == "hit"
+    assert calls == [("_read_spilled", False), ("_spill", False), ("_read_spilled", False)]
+
+
+def test_non_api_paths_skip_the_database(client, monkeypatch):
+    """`/`, `/metrics` and the docs are answered without looking up the catalog version."""
+    def no_database():
+        raise AssertionError("opened a database session")
+
+    monkeypatch.setattr(response_cache, "new_session", no_database)
+    for url in ["/", "/metrics", "/openapi.json", "/docs"]:
+        assert client.get(url).status_code == 200, url
@@ -0,0 +1,66 @@
+import asyncio
+
+from app import snapshot, versioning
+from app.includes import FIREARM_COLUMNS
+from app.models import Firearm, War
+from tests.conftest import TestingAsyncSessionLocal
+
+
+def catalog(firearm_ids, links=None) -> dict:
+    """Snapshot data for bare firearms with these ids, one war and `links` to it as (firearm_id, war_id)."""
+    firearms = {column: [None] * len(firearm_ids) for column in FIREARM_COLUMNS}
+    firearms["firearm_id"] = list(firearm_ids)
+    return {
+        "version": 1,
+        "firearms": firearms,
+        "lookups": {field: [[1, "World War II"]] if field == "wars" else [] for field in snapshot.LOOKUP_SCHEMAS},
+        "links": {field: (links or []) if field == "wars" else [] for field in snapshot.LOOKUP_SCHEMAS},
+    }
+
+
+def test_dangling_links_are_skipped():
+    """Links to firearms or lookup rows the snapshot doesn't have are counted and left out."""
+    snap = snapshot.Snapshot(catalog([1, 2], [[1, 1], [3, 1], [2, 7]]))
+    assert snap.dangling == 2
+    assert snap.firearms_of("wars", 1) == 0b01
+    assert snap.linked["wars"] == [(1,), ()]
+
+
+def test_dump_reads_again_when_the_version_moves(db, monkeypatch):
+    """A write landing between the first and last version read makes `dump` read the catalog again."""
+    db.add(Firearm(name="M1 Garand", wars=[War(name="World War II")]))
+    db.commit()
+    versions = iter([1, 2, 2, 2])
+
+    async def read(connection):
+        return next(versions)
+
+    monkeypatch.setattr(versioning, "read", read)
+
+    async def run():
+        async with TestingAsyncSessionLocal() as session:
+            return await snapshot.dump(session)
+
+    data = asyncio.run(run())
+    assert data["version"] == 2
+    assert data["firearms"]["name"] == ["M1 Garand"]
+    assert data["links"]["wars"] == [[1, 1]]
+
+
+def test_large_catalog():
+    """Bitmaps of a large catalog are built in one pass and deep offsets page through them correctly."""
+    size = 200_000
+    linked = list(range(0, size, 3))
+    snap = snapshot.Snapshot(catalog(range(1, size + 1), [[i + 1, 1] for i in linked]))
+    bitmap = snap.firearms_of("wars", 1)
+    assert bitmap.bit_count() == len(linked)
+
+    plan = type("Plan", (), {"columns": ["firearm_id"], "include": []})()
+    offset = len(linked) - 60
+    page = snap.firearm_page(plan, offset=offset, limit=50, bitmap=bitmap)
+    assert [row["firearm_id"] for row in page["items"]] == [i + 1 for i in linked[offset:offset + 50]]
+    assert page["has_more"] is True
+
+    rest = snap.firearm_page(plan, limit=50, cursor=page["next_cursor"], bitmap=bitmap)
+    assert [row["firearm_id"] for row in rest["items"]] == [i + 1 for i in linked[offset + 50:]]
+    assert rest["has_more"] is False
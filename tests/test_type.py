@@ -1,10 +1,14 @@
+from app.models import Type
+
 def test_get_types_empty(client):
     """
     Test getting firearm types from an empty database.
     """
     response = client.get("/api/v1/type/")
     assert response.status_code == 200
-    assert response.json() == []
+    data = response.json()
+    assert data["items"] == []
+    assert data["total"] == 0
 
 def test_get_type_not_found(client):
     """
@@ -13,3 +17,14 @@ def test_get_type_not_found(client):
     response = client.get("/api/v1/type/999")
     assert response.status_code == 404
     assert response.json()["detail"] == "Type not found"
+
+def test_search_types_partial_match(client, db):
+    """
+    Test the SQLite fallback of name search (case-insensitive substring).
+    """
+    db.add_all([Type(name=name) for name in ["Bolt-action rifle", "Submachine gun", "Battle rifle"]])
+    db.commit()
+
+    response = client.get("/api/v1/type/search?name=RIFLE")
+    assert response.status_code == 200
+    assert [t["name"] for t in response.json()["items"]] == ["Battle rifle", "Bolt-action rifle"]
@@ -1,3 +1,5 @@
+from app.models import War, Firearm, Cartridge
+
 def test_get_wars_empty(client):
     """
     Test getting wars from an empty database.
@@ -15,3 +17,90 @@ def test_get_war_not_found(client):
     response = client.get("/api/v1/war/999")
     assert response.status_code == 404
     assert response.json()["detail"] == "War not found"
+
+def test_get_wars_cursor_pagination(client, db):
+    """
+    Test walking the war list with next_cursor instead of offset.
+    """
+    db.add_all([War(name=name) for name in ["Korean War", "Vietnam War", "World War I"]])
+    db.commit()
+
+    response = client.get("/api/v1/war/?limit=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert [w["name"] for w in data["items"]] == ["Korean War", "Vietnam War"]
+    assert data["has_more"] is True
+
+    response = client.get(f"/api/v1/war/?limit=2&cursor={data['next_cursor']}")
+    assert response.status_code == 200
+    data = response.json()
+    assert [w["name"] for w in data["items"]] == ["World War I"]
+    assert data["offset"] is None
+    assert data["has_more"] is False
+    assert data["next_cursor"] is None
+
+def test_search_wars_cursor_pagination(client, db):
+    """
+    Test that search pages are keyed on (name, id).
+    """
+    db.add_all([War(name=name) for name in ["World War II", "World War I", "Korean War"]])
+    db.commit()
+
+    response = client.get("/api/v1/war/search/?query=world&limit=1")
+    data = response.json()
+    assert [w["name"] for w in data["items"]] == ["World War I"]
+
+    response = client.get(f"/api/v1/war/search/?query=world&limit=1&cursor={data['next_cursor']}")
+    data = response.json()
+    assert [w["name"] for w in data["items"]] == ["World War II"]
+    assert data["total"] == 2
+    assert data["has_more"] is False
+
+def test_get_wars_invalid_cursor(client):
+    """
+    Test that a malformed cursor is rejected.
+    """
+    response = client.get("/api/v1/war/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+def test_get_wars_not_modified(client):
+    """
+    Test that a matching If-None-Match returns 304 with no body.
+    """
+    response = client.get("/api/v1/war/")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"].startswith("public")
+
+    response = client.get("/api/v1/war/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get("/api/v1/war/?limit=10", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+def test_get_firearms_for_war(client, db):
+    """
+    Test that firearms used in a war come back with their nested wars and cartridges.
+    """
+    war = War(name="Winter War")
+    db.add(Firearm(name="Suomi KP/-31", wars=[war], cartridges=[Cartridge(name="9x19mm Parabellum")]))
+    db.commit()
+
+    response = client.get(f"/api/v1/war/{war.war_id}/firearms")
+    assert response.status_code == 200
+    [firearm] = response.json()["items"]
+    assert firearm["name"] == "Suomi KP/-31"
+    assert firearm["wars"] == [{"war_id": war.war_id, "name": "Winter War"}]
+    assert firearm["cartridges"][0]["name"] == "9x19mm Parabellum"
+
+def test_war_batch(client, db):
+    """
+    Test the war batch lookup.
+    """
+    db.add_all([War(name="Korean War"), War(name="Gulf War")])
+    db.commit()
+    body = client.get("/api/v1/war/batch?ids=2,3,1").json()
+    assert [w["war_id"] for w in body["items"]] == [2, 1]
+    assert body["missing"] == [3]